@@ -0,0 +1,38 @@
+"""
+Record title records from the ZDB Hydra API as benchmark fixtures
+
+    python benchmarks/record.py "psg=ZDB-1-CPO" --limit 50
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zdbpydra import Hydra  # noqa: E402
+
+from server import FIXTURES  # noqa: E402
+
+
+def main():
+    cli = argparse.ArgumentParser(description="Record ZDB titles as benchmark fixtures")
+    cli.add_argument("query", type=str)
+    cli.add_argument("--limit", type=int, default=50)
+    cli.add_argument("--output", type=str,
+                     default=os.path.join(FIXTURES, "titles.ndjson"))
+    args = cli.parse_args()
+    count = 0
+    with Hydra() as hydra, open(args.output, "w", encoding="utf-8") as output:
+        for title in hydra.stream(args.query, size=min(args.limit, 100)):
+            output.write(json.dumps(title.raw, ensure_ascii=False))
+            output.write("\n")
+            count += 1
+            if count >= args.limit:
+                break
+    print("Recorded {0} titles to {1}".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark suite for zdbpydra, run offline against the local stand-in server
+
+    python benchmarks/run.py                     # print results
+    python benchmarks/run.py --save              # update baseline.json
+    python benchmarks/run.py --compare           # compare with baseline.json
+
+Every benchmark reports a single number together with its unit and
+whether higher or lower values are better, so that regressions against
+the baseline can be detected (default tolerance: 20 percent).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zdbpydra import Hydra, docs  # noqa: E402
+
+from server import HydraServer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+PICA_FIELDS = [
+    "idn", "title", "title_supplement_joined", "issn_joined", "issn_l",
+    "publisher_joined", "product_code_joined", "zdb_code_joined", "bbg",
+    "dewey_joined", "oclc", "language", "parallel_id_joined", "parallel_issn_joined",
+    "access_status_joined", "latest_change_datetime"
+]
+
+BENCHMARKS = []
+
+
+def benchmark(unit, better="higher"):
+    def register(function):
+        BENCHMARKS.append((function.__name__, function, unit, better))
+        return function
+    return register
+
+
+def client(server, **kwargs):
+    hydra = Hydra(loglevel=30, **kwargs)
+    hydra.BASE_URL = server.base_url
+    hydra.CONTEXT_URL = server.context_url
+    return hydra
+
+
+def titles(server, count=100):
+    return [docs.TitleResponseParser(title) for title in server.corpus[:count]]
+
+
+@benchmark("records/s")
+def stream_throughput(server, args):
+    with client(server) as hydra:
+        start = time.perf_counter()
+        count = sum(1 for _ in hydra.stream("psg=ZDB-1-CPO", size=args.page_size))
+        return count / (time.perf_counter() - start)
+
+
+@benchmark("records/s")
+def stream_prefetch_throughput(server, args):
+    with client(server) as hydra:
+        start = time.perf_counter()
+        count = sum(1 for _ in hydra.stream("psg=ZDB-1-CPO", size=args.page_size,
+                                            workers=4))
+        return count / (time.perf_counter() - start)
+
+
+@benchmark("ms", better="lower")
+def title_latency(server, args):
+    with client(server) as hydra:
+        ids = [title["identifier"] for title in server.corpus[:args.lookups]]
+        start = time.perf_counter()
+        for id in ids:
+            hydra.title(id)
+        return (time.perf_counter() - start) / len(ids) * 1000
+
+
+@benchmark("us", better="lower")
+def pica_field_access(server, args):
+    records = titles(server)
+    start = time.perf_counter()
+    for title in records:
+        pica = docs.PicaParser(title.data)
+        for field in PICA_FIELDS:
+            getattr(pica, field)
+    elapsed = time.perf_counter() - start
+    return elapsed / (len(records) * len(PICA_FIELDS)) * 1000000
+
+
+@benchmark("us", better="lower")
+def csv_row(server, args):
+    records = [title.raw for title in titles(server)]
+    start = time.perf_counter()
+    for raw in records:
+        docs.CsvBuilder(raw).row
+    return (time.perf_counter() - start) / len(records) * 1000000
+
+
+@benchmark("MiB", better="lower")
+def scroll_peak_memory(server, args):
+    with client(server) as hydra:
+        tracemalloc.start()
+        hydra.scroll("psg=ZDB-1-CPO", size=args.page_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / (1024 * 1024)
+
+
+def run(args):
+    results = {}
+    with HydraServer(size=args.size, latency=args.latency) as server:
+        for name, function, unit, better in BENCHMARKS:
+            if args.only and name not in args.only:
+                continue
+            values = [function(server, args) for _ in range(args.repeat)]
+            value = max(values) if better == "higher" else min(values)
+            results[name] = {"value": round(value, 4), "unit": unit, "better": better}
+            print("{0:<28} {1:>12.3f} {2}".format(name, value, unit))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        reference = baseline["results"][name]["value"]
+        value = result["value"]
+        if not reference:
+            continue
+        change = (value - reference) / reference
+        if result["better"] == "lower":
+            change = -change
+        status = "ok"
+        if change < -tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        print("{0:<28} {1:>+8.1%} {2}".format(name, change, status))
+    return regressions
+
+
+def main():
+    cli = argparse.ArgumentParser(description="Run zdbpydra benchmarks offline")
+    cli.add_argument("--size", type=int, default=2000, help="titles served")
+    cli.add_argument("--page-size", type=int, default=100)
+    cli.add_argument("--lookups", type=int, default=200)
+    cli.add_argument("--latency", type=float, default=0.0,
+                     help="simulated server latency in seconds")
+    cli.add_argument("--repeat", type=int, default=3)
+    cli.add_argument("--only", type=str, nargs="*", default=None)
+    cli.add_argument("--baseline", type=str, default=BASELINE)
+    cli.add_argument("--save", action="store_true", help="write results to baseline")
+    cli.add_argument("--compare", action="store_true", help="compare results to baseline")
+    cli.add_argument("--tolerance", type=float, default=0.2)
+    args = cli.parse_args()
+    results = run(args)
+    if args.save:
+        baseline = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {"size": args.size, "page_size": args.page_size,
+                           "lookups": args.lookups, "latency": args.latency},
+            "results": results
+        }
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+            baseline_file.write("\n")
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+Serves a corpus of titles built from the recorded fixture records
+(fixtures/titles.ndjson) under the same routes as the API:
+
+    /api/tit/{id}.jsonld
+    /api/tit.jsonld?q={query}&size={size}&page={page}
+    /api/context/zdb.jsonld
+
+Queries are not evaluated, every query matches the whole corpus except
+for OR-combined zdbid clauses, which match the given titles.
+"""
+
+import os
+import re
+import copy
+import json
+import math
+import threading
+import urllib.parse
+import http.server
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(path=FIXTURES):
+    with open(os.path.join(path, "titles.ndjson"), encoding="utf-8") as titles_file:
+        titles = [json.loads(line) for line in titles_file if line.strip()]
+    with open(os.path.join(path, "context.jsonld"), encoding="utf-8") as context_file:
+        context = json.load(context_file)
+    return titles, context
+
+
+def build_corpus(titles, size):
+    """
+    Build a corpus of the given size by cycling the fixture records
+    and giving every copy its own ZDB-ID, IDN and ISSN
+    """
+    corpus = []
+    for i in range(size):
+        title = copy.deepcopy(titles[i % len(titles)])
+        identifier = "{0}-{1}".format(3000000 + i, i % 10)
+        issn = "{0:04d}-{1:04d}".format(i // 10000, i % 10000)
+        title["id"] = "https://ld.zdb-services.de/resource/{0}".format(identifier)
+        title["identifier"] = identifier
+        title["issn"] = [issn]
+        title["data"]["003@"] = [[[str(1100000000 + i)]]]
+        title["data"]["006Z"] = [[[identifier]]]
+        title["data"]["005A"][0][0] = [issn]
+        corpus.append(title)
+    return corpus
+
+
+class HydraHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, status=200):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/ld+json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            threading.Event().wait(server.latency)
+        if url.path == "/api/context/zdb.jsonld":
+            return self._send(server.context)
+        match = re.match(r"^/api/tit/(.+)\.jsonld$", url.path)
+        if match:
+            title = server.index.get(urllib.parse.unquote(match.group(1)))
+            members = [title] if title is not None else []
+            return self._send({"totalItems": len(members), "member": members})
+        if url.path == "/api/tit.jsonld":
+            params = urllib.parse.parse_qs(url.query)
+            query = params.get("q", [""])[0]
+            size = int(params.get("size", ["10"])[0])
+            page = int(params.get("page", ["1"])[0])
+            return self._send(server.page(query, size, page))
+        return self._send({"error": "not found"}, status=404)
+
+
+class HydraServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, size=1000, port=0, latency=0.0, fixtures=FIXTURES):
+        super().__init__(("127.0.0.1", port), HydraHandler)
+        titles, self.context = load_fixtures(fixtures)
+        self.corpus = build_corpus(titles, size)
+        self.index = {title["identifier"]: title for title in self.corpus}
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{0}/api/tit".format(self.server_address[1])
+
+    @property
+    def context_url(self):
+        return "http://127.0.0.1:{0}/api/context/zdb.jsonld".format(self.server_address[1])
+
+    def _address(self, query, size, page):
+        return "{0}.jsonld?q={1}&size={2}&page={3}".format(
+            self.base_url, urllib.parse.quote(query), size, page)
+
+    def _match(self, query):
+        ids = re.findall(r"zdbid=([^\s()]+)", query)
+        if ids:
+            return [self.index[id] for id in ids if id in self.index]
+        return self.corpus
+
+    def page(self, query, size, page):
+        titles = self._match(query)
+        pages = max(1, math.ceil(len(titles) / size))
+        members = titles[(page - 1) * size:page * size]
+        view = {
+            "id": self._address(query, size, page),
+            "type": "PartialCollectionView",
+            "totalItems": len(members),
+            "pageIndex": page,
+            "numberOfPages": pages,
+            "offset": (page - 1) * size,
+            "limit": size,
+            "first": self._address(query, size, 1),
+            "last": self._address(query, size, pages)
+        }
+        if page > 1:
+            view["previous"] = self._address(query, size, page - 1)
+        if page < pages:
+            view["next"] = self._address(query, size, page + 1)
+        return {
+            "id": self._address(query, size, page),
+            "freetextQuery": query,
+            "totalItems": len(titles),
+            "type": "Collection",
+            "member": members,
+            "view": view
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    cli = argparse.ArgumentParser(description="Serve a local stand-in of the ZDB Hydra API")
+    cli.add_argument("--port", type=int, default=8080)
+    cli.add_argument("--size", type=int, default=1000)
+    cli.add_argument("--latency", type=float, default=0.0)
+    args = cli.parse_args()
+    server = HydraServer(size=args.size, port=args.port, latency=args.latency)
+    print("Serving {0} titles at {1}".format(args.size, server.base_url))
+    server.serve_forever()
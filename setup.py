@@ -12,6 +12,11 @@ setup(
     url="https://github.com/herreio/zdbpydra",
     packages=["zdbpydra"],
     install_requires=["requests"],
+    extras_require={
+      "async": ["aiohttp"],
+      "fast": ["orjson"],
+      "arrow": ["pyarrow"],
+    },
     entry_points={
       'console_scripts': ['zdbpydra = zdbpydra.__main__:main'],
     },
@@ -6,33 +6,61 @@ from the German Union Catalogue of Serials (ZDB)
 __author__ = "Donatus Herre <donatus.herre@slub-dresden.de>"
 __version__ = "0.3.4"
 
+import threading
+
 from .client import Hydra
-from .docs import PicaParser, CsvBuilder
+from .aio import AsyncHydra
+from .cache import ResponseCache
+from .policy import RequestPolicy
+from .store import Store
+from .metrics import MetricsCollector, Observer
+from .graph import Crawler
+from .docs import PicaParser, CsvBuilder, Projection, Record, csv_rows
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(headers={}, loglevel=0):
+    """
+    Return a shared client (and thus a shared connection pool)
+    for the given headers and log level
+    """
+    key = (tuple(sorted(headers.items())), loglevel)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = Hydra(headers=dict(headers), loglevel=loglevel)
+        return _clients[key]
 
 
 def context(headers={}, loglevel=0):
-    hydra = Hydra(headers=headers, loglevel=loglevel)
+    hydra = shared_client(headers=headers, loglevel=loglevel)
     return hydra.context()
 
 
 def title(id, pica=False, headers={}, loglevel=0):
-    hydra = Hydra(headers=headers, loglevel=loglevel)
+    hydra = shared_client(headers=headers, loglevel=loglevel)
     return hydra.title(id, pica=pica)
 
 
-def search(query, size=10, page=1, headers={}, loglevel=0):
-    hydra = Hydra(headers=headers, loglevel=loglevel)
-    return hydra.search(query, size=size, page=page)
+def titles(ids, batch_size=50, pica=False, headers={}, loglevel=0):
+    hydra = shared_client(headers=headers, loglevel=loglevel)
+    return hydra.titles(ids, batch_size=batch_size, pica=pica)
+
+
+def search(query, size=10, page=1, headers={}, loglevel=0, fields=None):
+    hydra = shared_client(headers=headers, loglevel=loglevel)
+    return hydra.search(query, size=size, page=page, fields=fields)
 
 
-def scroll(query, size=10, page=1, headers={}, loglevel=0):
-    hydra = Hydra(headers=headers, loglevel=loglevel)
-    return hydra.scroll(query, size=size, page=page)
+def scroll(query, size=10, page=1, headers={}, loglevel=0, workers=1, fields=None):
+    hydra = shared_client(headers=headers, loglevel=loglevel)
+    return hydra.scroll(query, size=size, page=page, workers=workers, fields=fields)
 
 
-def stream(query, size=10, page=1, headers={}, loglevel=0):
-    hydra = Hydra(headers=headers, loglevel=loglevel)
-    return hydra.stream(query, size=size, page=page)
+def stream(query, size=10, page=1, headers={}, loglevel=0, workers=1, fields=None):
+    hydra = shared_client(headers=headers, loglevel=loglevel)
+    return hydra.stream(query, size=size, page=page, workers=workers, fields=fields)
 
 
 def parse_pica(data):
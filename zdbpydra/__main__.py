@@ -3,14 +3,30 @@ Command line utility for fetching JSON-LD data (with PICA+ data embedded)
 from the German Union Catalogue of Serials (ZDB)
 """
 
+import os
+import sys
 import argparse
 
-from . import title, search, stream, scroll
+from . import Hydra
+from . import docs
 from . import utils
+from . import export
+from . import columnar
+from . import shard
+from . import serve
+from .harvest import Harvester, Checkpoint, check_output
+from .sync import Sync
+from .store import Store
+from .cql import LocalIndex
+from .graph import Crawler
+from .partition import PARTITIONS
+from .metrics import MetricsCollector
+from .cache import ResponseCache
 from . import __version__
 
 
 LOGLEVEL = 0
+HARVEST_SIZE = 100
 HEADERS = {"User-Agent": "zdbpydra-cli {0}".format(__version__)}
 DESCRIPTION = """
 Fetch JSON-LD data (with PICA+ data embedded)
@@ -35,13 +51,60 @@ def print_result(result, pretty):
         print_raw(result.raw, pretty)
 
 
+def read_ids(path):
+    if path == "-":
+        lines = sys.stdin
+    else:
+        lines = open(path)
+    try:
+        return [line.strip() for line in lines if line.strip()]
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def write_records(records, fmt, zdbpydra_args):
+    fmt = zdbpydra_args.format or fmt
+    return export.export(records, fmt=fmt, path=zdbpydra_args.output,
+                         pretty=zdbpydra_args.pretty, workers=zdbpydra_args.workers)
+
+
+def read_fields(fields):
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def read_partitions(partitions):
+    if partitions in PARTITIONS:
+        return partitions
+    return [clause.strip() for clause in partitions.split(";") if clause.strip()]
+
+
+def get_cache(cache_dir, cache_ttl):
+    if cache_dir is None:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    ttl = None
+    if cache_ttl is not None:
+        ttl = {"title": cache_ttl, "search": cache_ttl}
+    return ResponseCache(cache_dir, ttl=ttl)
+
+
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        return serve.main(sys.argv[2:])
     zdbpydra_cli = argparse.ArgumentParser(
-        "zdbpydra", description=DESCRIPTION)
+        "zdbpydra", description=DESCRIPTION,
+        epilog="Run zdbpydra serve --help for the caching proxy server.")
     zdbpydra_cli.add_argument(
         "--id", type=str,
         help="id of title to fetch (default: None)",
         default=None)
+    zdbpydra_cli.add_argument(
+        "--ids", type=str,
+        help="file with ids of titles to fetch, one per line, - for stdin (default: None)",
+        default=None)
     zdbpydra_cli.add_argument(
         "--query", type=str,
         help="cql-based search query (default: None)",
@@ -54,6 +117,20 @@ def main():
         "--stream", type=bool,
         help="stream result set (default: False)",
         nargs='?', const=True, default=False)
+    zdbpydra_cli.add_argument(
+        "--partition", type=str,
+        help="stream or scroll result set in concurrent partitions, "
+             "medium, bbg or clauses separated by ; (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--shard", type=str,
+        help="stream or scroll shard i/N (0 <= i < N) of the pages of result set, "
+             "with manifest written to OUTPUT.shard.json or else to stderr (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--check-shards", type=str, nargs="+",
+        help="check shard manifests for completeness (default: None)",
+        default=None)
     zdbpydra_cli.add_argument(
         "--pica", type=bool,
         help="fetch pica data only (default: False)",
@@ -62,41 +139,227 @@ def main():
         "--pretty", type=bool,
         help="pretty print output (default: False)",
         nargs='?', const=True, default=False)
+    zdbpydra_cli.add_argument(
+        "--format", type=str, choices=export.FORMATS,
+        help="output format (default: ndjson for streams, json otherwise)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--fields", type=str,
+        help="comma-separated fields to output for result sets, e.g. identifier,pica.idn (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--workers", type=int,
+        help="number of processes building rows of csv exports (default: 1)",
+        default=1)
+    zdbpydra_cli.add_argument(
+        "--output", type=str,
+        help="output file, compressed if ending in .gz or .zst (default: stdout)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--checkpoint", type=str,
+        help="checkpoint file for resumable harvest of result set to output (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--resume", type=bool,
+        help="resume harvest from checkpoint (default: False)",
+        nargs='?', const=True, default=False)
+    zdbpydra_cli.add_argument(
+        "--sync", type=str,
+        help="ndjson mirror of result set to update with changed titles (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--sync-index", type=str,
+        help="cql index of latest change date to restrict sync queries, "
+             "without it every sync reads the whole result set (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--sync-ordered", type=bool,
+        help="stop sync at the first title older than the last sync, if results "
+             "are ordered by latest change, which is verified (default: False)",
+        nargs='?', const=True, default=False)
+    zdbpydra_cli.add_argument(
+        "--store", type=str,
+        help="local mirror store to load result set into or to look up ids in (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--offline", type=bool,
+        help="evaluate query against local mirror store (default: False)",
+        nargs='?', const=True, default=False)
+    zdbpydra_cli.add_argument(
+        "--crawl", type=int,
+        help="crawl relations of titles given by --id or --ids up to depth (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--metrics", type=str,
+        help="file to write request metrics to in prometheus text format (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--cache-dir", type=str,
+        help="directory of persistent response cache (default: None)",
+        default=None)
+    zdbpydra_cli.add_argument(
+        "--cache-ttl", type=int,
+        help="seconds to keep cached title and search responses (default: None)",
+        default=None)
     zdbpydra_args = zdbpydra_cli.parse_args()
-    if zdbpydra_args.id is None and zdbpydra_args.query is None:
+    if zdbpydra_args.check_shards is not None:
+        summary = shard.check(shard.load_manifests(zdbpydra_args.check_shards),
+                              names=zdbpydra_args.check_shards)
+        print_raw(summary, zdbpydra_args.pretty)
+        return None if summary["complete"] else 1
+    if zdbpydra_args.shard is not None:
+        try:
+            zdbpydra_args.shard = shard.parse_shard(zdbpydra_args.shard)
+        except ValueError as err:
+            zdbpydra_cli.error(str(err))
+    if zdbpydra_args.id is None and zdbpydra_args.ids is None \
+            and zdbpydra_args.query is None:
         zdbpydra_cli.print_help()
         return None
+    if zdbpydra_args.crawl is not None and zdbpydra_args.id is None \
+            and zdbpydra_args.ids is None:
+        zdbpydra_cli.error("crawl requires --id or --ids")
+    if zdbpydra_args.format == "parquet":
+        if zdbpydra_args.output is None:
+            zdbpydra_cli.error("parquet output requires --output")
+        if zdbpydra_args.fields is not None:
+            zdbpydra_cli.error("parquet output has fixed columns and does not support --fields")
+        try:
+            columnar.require_pyarrow()
+        except ImportError as err:
+            zdbpydra_cli.error(str(err))
+    if zdbpydra_args.checkpoint is not None:
+        fmt = zdbpydra_args.format or "ndjson"
+        try:
+            check_output(zdbpydra_args.output, fmt)
+            if zdbpydra_args.resume and zdbpydra_args.query is not None:
+                Checkpoint(zdbpydra_args.checkpoint).check(zdbpydra_args.query, HARVEST_SIZE, fmt)
+        except ValueError as err:
+            zdbpydra_cli.error(str(err))
+    if zdbpydra_args.fields is not None:
+        try:
+            docs.Projection(read_fields(zdbpydra_args.fields))
+        except ValueError as err:
+            zdbpydra_cli.error(str(err))
+    cache = get_cache(zdbpydra_args.cache_dir, zdbpydra_args.cache_ttl)
+    metrics = MetricsCollector()
+    with Hydra(headers=HEADERS, loglevel=LOGLEVEL, cache=cache,
+               observers=[metrics]) as hydra:
+        try:
+            status = run(hydra, zdbpydra_args)
+        finally:
+            if zdbpydra_args.metrics is not None:
+                metrics.write_prometheus(zdbpydra_args.metrics)
+    if cache is not None:
+        cache.close()
+    return status
+
+
+def run_crawl(source, zdbpydra_args):
+    if zdbpydra_args.ids is not None:
+        seeds = read_ids(zdbpydra_args.ids)
+    else:
+        seeds = [zdbpydra_args.id]
+    crawler = Crawler(source, depth=zdbpydra_args.crawl, loglevel=LOGLEVEL)
+    print_raw(crawler.crawl(seeds).as_dict(), zdbpydra_args.pretty)
+
+
+def run_shard(hydra, zdbpydra_args, fields, fmt):
+    index, count = zdbpydra_args.shard
+    part = hydra.shard(zdbpydra_args.query, index, count, size=100)
+    titles = part.stream()
+    if fields is not None:
+        titles = docs.project(titles, fields)
+    write_records(titles, fmt, zdbpydra_args)
+    if zdbpydra_args.output is not None and zdbpydra_args.output != "-":
+        part.save("{0}.shard.json".format(zdbpydra_args.output))
+    else:
+        print(json_output(part.manifest, zdbpydra_args.pretty), file=sys.stderr)
+    if not part.manifest["complete"]:
+        return 1
+
+
+def run_store(hydra, store, zdbpydra_args):
+    if zdbpydra_args.crawl is not None:
+        return run_crawl(store, zdbpydra_args)
+    if zdbpydra_args.ids is not None:
+        result = store.titles(read_ids(zdbpydra_args.ids), pica=zdbpydra_args.pica)
+        write_records(result.values(), "ndjson", zdbpydra_args)
+        return None
     if zdbpydra_args.id is not None:
-        result = title(zdbpydra_args.id, pica=zdbpydra_args.pica,
-                       headers=HEADERS, loglevel=LOGLEVEL)
+        result = store.title(zdbpydra_args.id, pica=zdbpydra_args.pica)
         if result:
             print_result(result, zdbpydra_args.pretty)
         return None
+    if zdbpydra_args.query is not None and zdbpydra_args.offline:
+        index = LocalIndex.from_store(store)
+        write_records(index.stream(zdbpydra_args.query, size=100,
+                                   fields=read_fields(zdbpydra_args.fields)),
+                      "ndjson", zdbpydra_args)
+        return None
     if zdbpydra_args.query is not None:
-        if zdbpydra_args.stream:
-            for serial in stream(zdbpydra_args.query, size=10,
-                                 page=1, headers={}, loglevel=LOGLEVEL):
-                if serial:
-                    print_result(serial, False)
+        count = store.load(hydra.stream(zdbpydra_args.query, size=100))
+        hydra.logger.info("Stored {0} titles in {1}".format(count, store.path))
+        return None
+
+
+def run(hydra, zdbpydra_args):
+    if zdbpydra_args.store is not None:
+        with Store(zdbpydra_args.store, loglevel=LOGLEVEL) as store:
+            return run_store(hydra, store, zdbpydra_args)
+    if zdbpydra_args.crawl is not None:
+        return run_crawl(hydra, zdbpydra_args)
+    if zdbpydra_args.ids is not None:
+        result = hydra.titles(read_ids(zdbpydra_args.ids), pica=zdbpydra_args.pica)
+        write_records(result.values(), "ndjson", zdbpydra_args)
+        return None
+    if zdbpydra_args.id is not None:
+        result = hydra.title(zdbpydra_args.id, pica=zdbpydra_args.pica)
+        if zdbpydra_args.format is not None or zdbpydra_args.output is not None:
+            write_records([result], "json", zdbpydra_args)
+        elif result:
+            print_result(result, zdbpydra_args.pretty)
+        return None
+    if zdbpydra_args.query is not None:
+        if zdbpydra_args.sync is not None:
+            sync = Sync(hydra, "{0}.sync.json".format(zdbpydra_args.sync),
+                        date_index=zdbpydra_args.sync_index,
+                        ordered=zdbpydra_args.sync_ordered)
+            summary = sync.run(zdbpydra_args.query, zdbpydra_args.sync)
+            print_raw(summary, zdbpydra_args.pretty)
+            if not summary["complete"]:
+                return 1
             return None
-        if zdbpydra_args.scroll:
-            result = scroll(zdbpydra_args.query, size=10, page=1,
-                            headers=HEADERS, loglevel=LOGLEVEL)
-            if result and isinstance(result, list):
-                result_out = []
-                for serial in result:
-                    result_out.append(serial.raw)
-                print_raw(result_out, zdbpydra_args.pretty)
+        if zdbpydra_args.checkpoint is not None:
+            harvester = Harvester(hydra, zdbpydra_args.query, size=HARVEST_SIZE,
+                                  checkpoint=Checkpoint(zdbpydra_args.checkpoint))
+            state = harvester.run(zdbpydra_args.output,
+                                  fmt=zdbpydra_args.format or "ndjson",
+                                  pretty=zdbpydra_args.pretty,
+                                  resume=zdbpydra_args.resume)
+            if not state["complete"]:
+                return 1
+            return None
+        fields = read_fields(zdbpydra_args.fields)
+        if zdbpydra_args.stream or zdbpydra_args.scroll:
+            fmt = "ndjson" if zdbpydra_args.stream else "json"
+            if zdbpydra_args.shard is not None:
+                return run_shard(hydra, zdbpydra_args, fields, fmt)
+            if zdbpydra_args.partition is not None:
+                titles = hydra.harvest(zdbpydra_args.query,
+                                       read_partitions(zdbpydra_args.partition), size=100)
+                if fields is not None:
+                    titles = docs.project(titles, fields)
+            else:
+                titles = hydra.stream(zdbpydra_args.query, size=10, page=1, fields=fields)
+            write_records(titles, fmt, zdbpydra_args)
             return None
         else:
-            result = search(zdbpydra_args.query)
+            result = hydra.search(zdbpydra_args.query, fields=fields)
             if result and isinstance(result, list):
-                result_out = []
-                for serial in result:
-                    result_out.append(serial.raw)
-                print_raw(result_out, zdbpydra_args.pretty)
+                write_records(result, "json", zdbpydra_args)
             return None
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Asynchronous client class for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+Requires the optional dependency aiohttp (pip install zdbpydra[async])
+"""
+
+import asyncio
+
+from . import docs
+from . import utils
+from . import __version__
+
+aiohttp = None
+
+
+def import_aiohttp():
+    """
+    Import aiohttp on first use, which keeps it from slowing down
+    import zdbpydra for users of the synchronous client
+    """
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            raise ImportError("AsyncHydra requires aiohttp (pip install zdbpydra[async])")
+        aiohttp = module
+    return aiohttp
+
+
+class AsyncHydra:
+
+    def __init__(self, headers={}, loglevel=0, pool_size=10, concurrency=10, session=None):
+        import_aiohttp()
+        self.headers = dict(headers)
+        if "User-Agent" not in self.headers:
+            self.headers["User-Agent"] = "zdbpydra {0}".format(__version__)
+        self.logger = utils.get_logger("zdbpydra", loglevel=loglevel)
+        self.BASE_URL = "https://zeitschriftendatenbank.de/api/tit"
+        self.CONTEXT_URL = "https://zeitschriftendatenbank.de/api/context/zdb.jsonld"
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._session_owned = session is None
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        if self._session_owned and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self.session
+
+    async def _fetch(self, url):
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.get(url, headers=self.headers) as response:
+                    if response.status != 200:
+                        self.logger.error("HTTP request to {0} failed!".format(url))
+                        self.logger.error("HTTP response code is {0}.".format(response.status))
+                        return None
+                    content = await response.read()
+                    try:
+                        return utils.json_loads(content)
+                    except utils.json_errors():
+                        self.logger.error(
+                            "Failed to parse JSON data retrieved from URL {0}".format(url))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                self.logger.error(err.__class__.__name__)
+
+    async def context(self):
+        return await self._fetch(self.CONTEXT_URL)
+
+    async def _title(self, id):
+        url = "{0}/{1}.jsonld".format(self.BASE_URL, id)
+        response = await self._fetch(url)
+        if response is not None:
+            if "totalItems" in response and response["totalItems"] == 1:
+                return docs.TitleResponseParser(response["member"][0])
+            else:
+                self.logger.info("Title with id {0} not found!".format(id))
+
+    async def title(self, id, pica=False):
+        response = await self._title(id)
+        if response is not None:
+            if pica:
+                return response._parser_data
+            return response
+
+    def address(self, query, size, page):
+        return "{0}.jsonld?q={1}&size={2}&page={3}".format(self.BASE_URL,
+                                                           query, size, page)
+
+    async def total(self, query):
+        url = self.address(query, 1, 1)
+        response = await self._fetch(url)
+        if response is not None:
+            return docs.SearchResponseParser(response).total_items
+        return 0
+
+    async def _search(self, query, size, page):
+        url = self.address(query, size, page)
+        response = await self._fetch(url)
+        if response is not None:
+            return docs.SearchResponseParser(response)
+
+    async def search(self, query, size=10, page=1):
+        response = await self._search(query, size, page)
+        if response is not None:
+            if type(response.member) == list:
+                if len(response.member) > 0:
+                    return [docs.TitleResponseParser(title)
+                            for title in response.member]
+
+    def _members(self, result):
+        titles = result.member
+        if titles is not None:
+            for title in titles:
+                yield docs.TitleResponseParser(title)
+
+    async def stream(self, query, size=100, page=1, workers=1):
+        result = await self._search(query, size, page)
+        if result is None or result.total_items == 0:
+            return
+        for title in self._members(result):
+            yield title
+        view = result.view__parser
+        if workers > 1 and view is not None and view.number_of_pages:
+            pages = list(range(page + 1, int(view.number_of_pages) + 1))
+            for start in range(0, len(pages), workers):
+                results = await asyncio.gather(
+                    *[self._search(query, size, number)
+                      for number in pages[start:start + workers]])
+                for result in results:
+                    if result is None:
+                        return
+                    for title in self._members(result):
+                        yield title
+            return
+        url = result.view_next
+        while url:
+            result = await self._fetch(url)
+            if result is None:
+                return
+            result = docs.SearchResponseParser(result)
+            for title in self._members(result):
+                yield title
+            url = result.view_next
+
+    async def scroll(self, query, size=100, page=1, workers=1):
+        titles = []
+        async for doc in self.stream(query, size=size, page=page, workers=workers):
+            titles.append(doc)
+        return titles
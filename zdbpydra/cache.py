@@ -0,0 +1,153 @@
+"""
+Persistent response cache for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+Decoded JSON responses are stored keyed by URL in a single SQLite file.
+Entries expire after an endpoint specific time to live and the least
+recently used entries are evicted once the cache exceeds its size limit.
+Access times of cache hits are kept in memory and written in batches.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from . import utils
+
+CACHE_FILE = "zdbpydra.sqlite"
+
+CACHE_TTL = {
+    "context": 7 * 24 * 60 * 60,
+    "title": 24 * 60 * 60,
+    "search": 60 * 60
+}
+
+CACHE_SIZE = 512 * 1024 * 1024
+
+ACCESS_BATCH = 1000
+
+EVICT_BATCH = 100
+
+
+class ResponseCache:
+
+    def __init__(self, path, ttl=None, max_size=CACHE_SIZE):
+        if os.path.isdir(path):
+            path = os.path.join(path, CACHE_FILE)
+        self.path = path
+        self.ttl = dict(CACHE_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, endpoint TEXT, data TEXT, "
+            "size INTEGER, expires REAL, accessed REAL)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._db.commit()
+            self._db.close()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self._size}
+
+    def get(self, url):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, size, expires FROM responses WHERE url = ?",
+                (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            data, size, expires = row
+            if expires is not None and expires < now:
+                self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._db.commit()
+                self._size -= size
+                self.misses += 1
+                return None
+            self._accessed[url] = now
+            if len(self._accessed) >= ACCESS_BATCH:
+                self._flush_accessed()
+                self._db.commit()
+            self.hits += 1
+        return utils.json_loads(data)
+
+    def put(self, url, data, endpoint="search"):
+        ttl = self.ttl.get(endpoint)
+        if ttl is not None and ttl <= 0:
+            return
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        data = utils.json_str(data)
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            row = self._db.execute("SELECT size FROM responses WHERE url = ?",
+                                   (url,)).fetchone()
+            if row is not None:
+                self._size -= row[0]
+            self._accessed.pop(url, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (url, endpoint, data, size, expires, now))
+            self._size += size
+            self._evict()
+            self._db.commit()
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE url = ?",
+                                 [(accessed, url) for url, accessed in self._accessed.items()])
+            self._accessed = {}
+
+    def _evict(self):
+        if self.max_size is None or self._size <= self.max_size:
+            return
+        self._flush_accessed()
+        while self._size > self.max_size:
+            rows = self._db.execute(
+                "SELECT url, size FROM responses ORDER BY accessed LIMIT ?",
+                (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            urls = []
+            for url, size in rows:
+                if self._size <= self.max_size:
+                    break
+                urls.append((url,))
+                self._size -= size
+            self._db.executemany("DELETE FROM responses WHERE url = ?", urls)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._accessed = {}
+            self._size = 0
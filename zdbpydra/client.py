@@ -8,27 +8,171 @@ For more information on querying the interface, see
 https://zeitschriftendatenbank.de/services/schnittstellen/hilfe-zur-suche
 """
 
+import time
+import queue
+import threading
+import collections
+import concurrent.futures
+
+import requests
+
 from . import docs
 from . import utils
+from . import partition
+from . import shard as sharding
+from .scan import CHUNK_SIZE, PageScanner, ScanError
+from .policy import RequestPolicy
+from .metrics import RequestEvent
 
 
 class Hydra:
 
-    def __init__(self, headers={}, loglevel=0):
+    def __init__(self, headers={}, loglevel=0, pool_size=10, session=None, cache=None,
+                 policy=None, observers=None, coalesce=True):
         self.headers = headers
         self.logger = utils.get_logger("zdbpydra", loglevel=loglevel)
         self.BASE_URL = "https://zeitschriftendatenbank.de/api/tit"
         self.CONTEXT_URL = "https://zeitschriftendatenbank.de/api/context/zdb.jsonld"
+        self._session_owned = session is None
+        if session is None:
+            session = utils.get_session(pool_size=pool_size)
+        self.session = session
+        self.cache = cache
+        if policy is None:
+            policy = RequestPolicy()
+        self.policy = policy
+        self.observers = list(observers) if observers is not None else []
+        self.flight = utils.SingleFlight() if coalesce else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._session_owned and self.session is not None:
+            self.session.close()
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def _notify(self, event):
+        for observer in self.observers:
+            try:
+                observer.on_request(event)
+            except Exception as err:
+                self.logger.error("Observer {0} failed: {1}".format(
+                    observer.__class__.__name__, err))
+
+    def _request(self, url, event):
+        utils.reset_connect_time()
+        start = time.perf_counter()
+        response = utils.get_request(url, headers=self.headers, session=self.session,
+                                     policy=self.policy, stream=True, read=True)
+        end = time.perf_counter()
+        headers_received = None
+        if self.policy is not None:
+            headers_received = self.policy.last_headers_received
+        if headers_received is None:
+            headers_received = end
+        if response is not None:
+            event.status = response.status_code
+            event.bytes = len(response.content)
+        event.connect = utils.connect_time()
+        event.ttfb = max(0.0, headers_received - start - event.connect)
+        event.download = end - headers_received
+        event.elapsed = end - start
+        if self.policy is not None:
+            event.retries = self.policy.last_retries
+        return utils.response_json(response)
 
-    def _fetch(self, url):
-        return utils.json_request(url, headers=self.headers)
+    def _fetch_once(self, url, endpoint):
+        event = RequestEvent(url, endpoint=endpoint)
+        if self.cache is not None:
+            response = self.cache.get(url)
+            if response is not None:
+                event.cache_hit = True
+                self._notify(event)
+                return response, event
+        response = self._request(url, event)
+        self._notify(event)
+        if self.cache is not None and response is not None:
+            self.cache.put(url, response, endpoint=endpoint)
+        return response, event
+
+    def _fetch(self, url, endpoint="search"):
+        if self.flight is None:
+            return self._fetch_once(url, endpoint)[0]
+        start = time.perf_counter()
+        (response, shared_event), shared = self.flight.do(url, self._fetch_once, url, endpoint)
+        if shared:
+            event = RequestEvent(url, endpoint=endpoint)
+            event.coalesced = True
+            event.status = shared_event.status
+            event.bytes = shared_event.bytes
+            event.elapsed = time.perf_counter() - start
+            self._notify(event)
+        return response
+
+    def _fetch_members(self, url, endpoint="search"):
+        """
+        Fetch a result page and yield its members as soon as they are
+        parsed from the response body; return the remaining fields
+        of the page (or None if the request failed)
+        """
+        event = RequestEvent(url, endpoint=endpoint)
+        if self.cache is not None:
+            response = self.cache.get(url)
+            if response is not None:
+                event.cache_hit = True
+                self._notify(event)
+                yield from response.get("member") or []
+                return response
+        utils.reset_connect_time()
+        start = time.perf_counter()
+        response = utils.get_request(url, headers=self.headers, session=self.session,
+                                     policy=self.policy, stream=True)
+        headers_received = time.perf_counter()
+        event.connect = utils.connect_time()
+        event.ttfb = max(0.0, headers_received - start - event.connect)
+        if self.policy is not None:
+            event.retries = self.policy.last_retries
+        if response is not None:
+            event.status = response.status_code
+        if not utils.response_ok(response):
+            if response is not None:
+                response.close()
+            event.elapsed = headers_received - start
+            self._notify(event)
+            return None
+        scanner = PageScanner(response.iter_content(chunk_size=CHUNK_SIZE))
+        try:
+            yield from scanner.members()
+        except ScanError as err:
+            self.logger.error("Failed to parse JSON data retrieved from URL {0}".format(url))
+            self.logger.error(err)
+            return None
+        except requests.exceptions.RequestException as err:
+            self.logger.error("Failed to read response from URL {0}".format(url))
+            self.logger.error(err.__class__.__name__)
+            event.status = None
+            return None
+        finally:
+            response.close()
+            end = time.perf_counter()
+            event.bytes = scanner.bytes
+            event.download = end - headers_received
+            event.elapsed = end - start
+            self._notify(event)
+        return scanner.fields
 
     def context(self):
-        return self._fetch(self.CONTEXT_URL)
+        return self._fetch(self.CONTEXT_URL, endpoint="context")
 
     def _title(self, id):
         url = "{0}/{1}.jsonld".format(self.BASE_URL, id)
-        response = self._fetch(url)
+        response = self._fetch(url, endpoint="title")
         if response is not None:
             if "totalItems" in response and response["totalItems"] == 1:
                 return docs.TitleResponseParser(response["member"][0])
@@ -42,6 +186,38 @@ class Hydra:
                 return response._parser_data
             return response
 
+    def _titles(self, ids):
+        query = " or ".join("zdbid={0}".format(id) for id in ids)
+        response = self._search(query, len(ids), 1)
+        found = {}
+        if response is not None and isinstance(response.member, list):
+            for member in response.member:
+                title = docs.TitleResponseParser(member)
+                if title.identifier in ids:
+                    found[title.identifier] = title
+        return found
+
+    def titles(self, ids, batch_size=50, pica=False):
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        for start in range(0, len(ids), batch_size):
+            found.update(self._titles(ids[start:start + batch_size]))
+        result = {}
+        for id in ids:
+            title = found.get(id)
+            if title is None:
+                title = self._title(id)
+            if title is not None and pica:
+                title = title._parser_data
+            result[id] = title
+        return result
+
+    def lookup_issn(self, issn, size=100):
+        result = self.search("iss={0}".format(issn), size=size)
+        if result is not None:
+            return result
+        return []
+
     def address(self, query, size, page):
         return "{0}.jsonld?q={1}&size={2}&page={3}".format(self.BASE_URL,
                                                            query, size, page)
@@ -59,33 +235,177 @@ class Hydra:
         if response is not None:
             return docs.SearchResponseParser(response)
 
-    def search(self, query, size=10, page=1):
+    def search(self, query, size=10, page=1, fields=None):
         response = self._search(query, size, page)
         if response is not None:
             if type(response.member) == list:
                 if len(response.member) > 0:
-                    return [docs.TitleResponseParser(title)
-                            for title in response.member]
+                    titles = [docs.TitleResponseParser(title)
+                              for title in response.member]
+                    if fields is not None:
+                        return list(docs.project(titles, fields))
+                    return titles
+
+    def _members(self, result):
+        titles = result.member
+        if titles is not None:
+            for title in titles:
+                yield docs.TitleResponseParser(title)
 
-    def stream(self, query, size=100, page=1):
+    def _stream_prefetch(self, query, size, page, workers):
+        result = self._search(query, size, page)
+        if result is None or result.total_items == 0:
+            return
+        yield from self._members(result)
+        view = result.view__parser
+        if view is None or not view.number_of_pages:
+            url = result.view_next
+            while url:
+                result = self._fetch(url)
+                if result is None:
+                    return
+                result = docs.SearchResponseParser(result)
+                yield from self._members(result)
+                url = result.view_next
+            return
+        pages = collections.deque(range(page + 1, int(view.number_of_pages) + 1))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        pending = collections.deque()
+        try:
+            while pages and len(pending) < workers:
+                pending.append(executor.submit(self._search, query, size, pages.popleft()))
+            while pending:
+                result = pending.popleft().result()
+                if result is None:
+                    return
+                if pages:
+                    pending.append(executor.submit(self._search, query, size, pages.popleft()))
+                yield from self._members(result)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _stream_incremental(self, query, size, page):
+        url = self.address(query, size, page)
+        while url:
+            members = self._fetch_members(url)
+            while True:
+                try:
+                    member = next(members)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+                yield docs.TitleResponseParser(member)
+            if result is None:
+                return
+            url = docs.SearchResponseParser(result).view_next
+
+    def shard(self, query, index, count, size=100, page=1):
+        """
+        Return shard index of count of the pages of the query, whose
+        method stream yields its titles and whose manifest tells whether
+        the shard is complete, see shard.Shard
+        """
+        return sharding.Shard(self, query, index, count, size=size, page=page)
+
+    def stream(self, query, size=100, page=1, workers=1, incremental=False, fields=None,
+               shard=None):
+        if shard is not None:
+            titles = sharding.stream(self, query, shard, size=size, page=page)
+        else:
+            titles = self._stream(query, size, page, workers, incremental)
+        if fields is not None:
+            titles = docs.project(titles, fields)
+        yield from titles
+
+    def _stream(self, query, size, page, workers, incremental):
+        if workers > 1:
+            yield from self._stream_prefetch(query, size, page, workers)
+            return
         total = self.total(query)
         if total == 0:
             return
+        if incremental:
+            yield from self._stream_incremental(query, size, page)
+            return
         url = self.address(query, size, page)
         while url:
             result = self._fetch(url)
             if result is not None:
                 result = docs.SearchResponseParser(result)
-                titles = result.member
-                if titles is not None:
-                    for title in titles:
-                        yield docs.TitleResponseParser(title)
+                yield from self._members(result)
                 url = result.view_next
             else:
                 url = None
 
-    def scroll(self, query, size=100, page=1):
+    def _put(self, results, item, stop):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _harvest_partition(self, query, size, total, results, stop, done):
+        count = 0
+        try:
+            for title in self.stream(query, size=size):
+                if not self._put(results, title, stop):
+                    return
+                count += 1
+            if count != total:
+                self.logger.warning("Harvested {0} instead of {1} titles of {2}".format(
+                    count, total, query))
+        except Exception as err:
+            self.logger.error("Harvest of {0} failed: {1}".format(query, err))
+        finally:
+            self._put(results, done, stop)
+
+    def harvest(self, query, partitions, size=100, workers=4):
+        """
+        Stream all titles matching the query by harvesting sub-queries
+        concurrently, see partition.split. Titles are de-duplicated by
+        identifier and a warning is logged if the number of distinct
+        titles differs from the total of the query. If the split is not
+        accepted, the query is streamed as a whole.
+        """
+        parts = partition.split(self, query, partitions, workers=workers)
+        if parts is None:
+            yield from self.stream(query, size=size)
+            return
+        self.logger.info("Harvest {0} in {1} partitions".format(query, len(parts)))
+        results = queue.Queue(maxsize=workers * size)
+        stop = threading.Event()
+        done = object()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            for subquery, total in parts:
+                executor.submit(self._harvest_partition, subquery, size, total,
+                                results, stop, done)
+            seen = set()
+            remaining = len(parts)
+            while remaining > 0:
+                title = results.get()
+                if title is done:
+                    remaining -= 1
+                    continue
+                if title.identifier in seen:
+                    continue
+                seen.add(title.identifier)
+                yield title
+            total = sum(subtotal for _, subtotal in parts)
+            if len(seen) != total:
+                self.logger.warning("Harvested {0} distinct titles instead of {1} of {2}".format(
+                    len(seen), total, query))
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def scroll(self, query, size=100, page=1, workers=1, incremental=False, fields=None):
         titles = []
-        for doc in self.stream(query, size=size, page=page):
+        for doc in self.stream(query, size=size, page=page, workers=workers,
+                               incremental=incremental, fields=fields):
             titles.append(doc)
         return titles
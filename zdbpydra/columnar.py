@@ -0,0 +1,222 @@
+"""
+Columnar extraction of titles retrieved from the German Union Catalogue of Serials (ZDB)
+
+Titles are collected into batches of columns covering the fields of the
+CSV export (see docs.CSV_HEADER). Repeatable fields are kept as list
+columns instead of joined strings. Batches can be converted to Arrow
+tables and written to Parquet files row group by row group, which
+requires the optional dependency pyarrow (pip install zdbpydra[arrow]).
+Without pyarrow, batches are plain lists of columns. Compact records
+(see docs.Projection) holding the fields of all columns can be collected
+as well.
+"""
+
+from . import docs
+
+pyarrow = None
+
+COLUMNS = [
+  ("id", "identifier", False),
+  ("idn", "pica.idn", False),
+  ("title", "pica.title", False),
+  ("title_supplement", "pica.title_supplement", True),
+  ("title_responsibility", "pica.title_responsibility", False),
+  ("medium", "medium", False),
+  ("issn", "pica.issn_lazy", True),
+  ("issn_l", "pica.issn_l", False),
+  ("publisher", "pica.publisher", True),
+  ("publisher_place", "pica.publisher_place", True),
+  ("psg", "pica.product_code", True),
+  ("code", "pica.zdb_code", True),
+  ("bbg", "pica.bbg", False),
+  ("ddc", "pica.dewey", True),
+  ("access_status", "pica.access_status", True),
+  ("access_rights", "pica.access_rights", True),
+  ("access_source", "pica.access_source", True),
+  ("parallel_id", "pica.parallel_id", True),
+  ("parallel_idn", "pica.parallel_idn", True),
+  ("parallel_issn", "pica.parallel_issn", True),
+  ("parallel_bbg", "pica.parallel_bbg", True),
+  ("parallel_type", "pica.parallel_type", True)
+]
+
+BATCH_SIZE = 10000
+
+
+def require_pyarrow():
+    """
+    Import pyarrow on first use, which keeps it from slowing down
+    import zdbpydra for users without Arrow or Parquet output
+    """
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow as module
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Arrow and Parquet output requires pyarrow (pip install zdbpydra[arrow])")
+        pyarrow = module
+    return pyarrow
+
+
+def get_columns(names=None):
+    if names is None:
+        return list(COLUMNS)
+    columns = {column[0]: column for column in COLUMNS}
+    for name in names:
+        if name not in columns:
+            raise ValueError("Unknown column {0}!".format(name))
+    return [columns[name] for name in names]
+
+
+def arrow_schema(columns=COLUMNS):
+    require_pyarrow()
+    return pyarrow.schema([
+        (name, pyarrow.list_(pyarrow.string()) if repeated else pyarrow.string())
+        for name, _, repeated in columns])
+
+
+class ColumnBatch:
+    """
+    Batch of titles stored column by column
+    """
+
+    def __init__(self, names=None):
+        self.spec = get_columns(names)
+        self.names = [name for name, _, _ in self.spec]
+        self.fields = [field for _, field, _ in self.spec]
+        self.projection = docs.Projection(self.fields)
+        self.columns = [[] for _ in self.spec]
+        self._repeated = [repeated for _, _, repeated in self.spec]
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def _values(self, record):
+        try:
+            return [record[field] for field in self.fields]
+        except KeyError as err:
+            raise ValueError("Record lacks field {0} of column {1}!".format(
+                err.args[0], self.names[self.fields.index(err.args[0])]))
+
+    def append(self, title):
+        if isinstance(title, docs.Record):
+            record = self._values(title)
+        else:
+            record = self.projection(title)
+        if record is None:
+            return False
+        for column, repeated, value in zip(self.columns, self._repeated, record):
+            if repeated:
+                if isinstance(value, tuple):
+                    value = list(value)
+                elif value is not None:
+                    value = [value]
+            elif isinstance(value, tuple):
+                value = "|".join(value)
+            column.append(value)
+        return True
+
+    def extend(self, titles):
+        for title in titles:
+            self.append(title)
+
+    def clear(self):
+        self.columns = [[] for _ in self.spec]
+
+    def to_dict(self):
+        return dict(zip(self.names, self.columns))
+
+    def to_arrow(self):
+        require_pyarrow()
+        schema = arrow_schema(self.spec)
+        arrays = [pyarrow.array(column, type=field.type)
+                  for column, field in zip(self.columns, schema)]
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def batches(titles, batch_size=BATCH_SIZE, names=None):
+    """
+    Yield batches of at most batch_size titles (the batch is reused)
+    """
+    batch = ColumnBatch(names)
+    for title in titles:
+        batch.append(title)
+        if len(batch) >= batch_size:
+            yield batch
+            batch.clear()
+    if len(batch) > 0:
+        yield batch
+
+
+def to_columns(titles, names=None):
+    """
+    Return a dictionary of column names and lists of values
+    """
+    batch = ColumnBatch(names)
+    batch.extend(titles)
+    return batch.to_dict()
+
+
+def to_arrow(titles, batch_size=BATCH_SIZE, names=None):
+    """
+    Return an Arrow table of the given titles
+    """
+    require_pyarrow()
+    tables = [batch.to_arrow() for batch in batches(titles, batch_size, names)]
+    if len(tables) == 0:
+        return arrow_schema(get_columns(names)).empty_table()
+    return pyarrow.concat_tables(tables)
+
+
+class ParquetWriter:
+    """
+    Write titles to a Parquet file, one row group per batch_size titles
+    """
+
+    def __init__(self, path, batch_size=BATCH_SIZE, names=None, compression="zstd"):
+        require_pyarrow()
+        self.path = path
+        self.batch_size = batch_size
+        self.batch = ColumnBatch(names)
+        self.writer = pyarrow.parquet.ParquetWriter(
+            path, arrow_schema(self.batch.spec), compression=compression)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _flush(self):
+        if len(self.batch) > 0:
+            self.writer.write_table(self.batch.to_arrow())
+            self.batch.clear()
+
+    def write(self, title):
+        if self.batch.append(title):
+            self.count += 1
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+
+    def write_all(self, titles):
+        for title in titles:
+            self.write(title)
+        return self.count
+
+    def close(self):
+        if self.writer is not None:
+            self._flush()
+            self.writer.close()
+            self.writer = None
+
+
+def write_parquet(titles, path, batch_size=BATCH_SIZE, names=None, compression="zstd"):
+    """
+    Write the given titles incrementally to a Parquet file at path and
+    return the number of titles written
+    """
+    with ParquetWriter(path, batch_size=batch_size, names=names,
+                       compression=compression) as writer:
+        return writer.write_all(titles)
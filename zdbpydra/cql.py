@@ -0,0 +1,316 @@
+"""
+Offline evaluation of CQL queries against a local mirror of titles
+from the German Union Catalogue of Serials (ZDB)
+
+Supported is a subset of CQL: search clauses of the form index=value
+(relations =, ==, exact, any, all and <>), right truncation with *,
+the boolean operators and, or, not (equal precedence, evaluated from
+left to right as in CQL) and parentheses. Terms without index are
+matched against the words of the title.
+
+For more information on querying the interface, see
+https://zeitschriftendatenbank.de/services/schnittstellen/hilfe-zur-suche
+"""
+
+import re
+import math
+
+from . import docs
+
+TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|(==|<>|=)|([^\s()="<>]+))')
+
+RELATIONS = ["=", "==", "<>", "exact", "any", "all"]
+
+BOOLEANS = ["and", "or", "not"]
+
+WORD = re.compile(r"\w+")
+
+
+def _values(values):
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        values = [values]
+    return [str(value).lower() for value in values if value]
+
+
+def _words(values):
+    words = []
+    for value in _values(values):
+        words.extend(WORD.findall(value))
+    return words
+
+
+INDEXES = {
+    "psg": lambda title, pica: _values(pica.product_code),
+    "code": lambda title, pica: _values(pica.zdb_code),
+    "medium": lambda title, pica: _values(title.medium),
+    "spr": lambda title, pica: _values(pica.language),
+    "ddc": lambda title, pica: _values(pica.dewey),
+    "bbg": lambda title, pica: _values(pica.bbg),
+    "zdbid": lambda title, pica: _values(title.identifier),
+    "idn": lambda title, pica: _values(pica.idn),
+    "iss": lambda title, pica: _values(pica.issn_lazy),
+    "tit": lambda title, pica: _words(pica.title or title.title)
+}
+
+ALIASES = {
+    "language": "spr",
+    "dewey": "ddc",
+    "zdb_code": "code",
+    "product_code": "psg",
+    "issn": "iss",
+    "title": "tit",
+    "cql.serverchoice": "tit"
+}
+
+WORD_INDEXES = ["tit"]
+
+
+def tokenize(query):
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError("Invalid CQL query at position {0}: {1}".format(
+                position, query))
+        position = match.end()
+        opening, closing, quoted, relation, word = match.groups()
+        if opening:
+            tokens.append(("(", opening))
+        elif closing:
+            tokens.append((")", closing))
+        elif quoted is not None:
+            tokens.append(("term", re.sub(r"\\(.)", r"\1", quoted)))
+        elif relation:
+            tokens.append(("relation", relation))
+        else:
+            tokens.append(("term", word))
+    return tokens
+
+
+class Parser:
+    """
+    Parse a CQL query into a tree of tuples:
+
+        ("clause", index, relation, value)
+        ("and" | "or" | "not", left, right)
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.position = 0
+
+    def _peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        tree = self._boolean()
+        if self.position < len(self.tokens):
+            raise ValueError("Unexpected {0} in CQL query: {1}".format(
+                self._peek()[1], self.query))
+        return tree
+
+    def _boolean(self):
+        tree = self._clause()
+        while True:
+            kind, value = self._peek()
+            if kind == "term" and value.lower() in BOOLEANS:
+                self._next()
+                tree = (value.lower(), tree, self._clause())
+            else:
+                return tree
+
+    def _clause(self):
+        kind, value = self._next()
+        if kind == "(":
+            tree = self._boolean()
+            if self._next()[0] != ")":
+                raise ValueError("Missing closing parenthesis in CQL query: {0}".format(
+                    self.query))
+            return tree
+        if kind != "term":
+            raise ValueError("Unexpected {0} in CQL query: {1}".format(value, self.query))
+        relation_kind, relation = self._peek()
+        if relation_kind == "relation" or \
+                (relation_kind == "term" and relation.lower() in RELATIONS
+                 and self._peek(1)[0] == "term"):
+            self._next()
+            term_kind, term = self._next()
+            if term_kind != "term":
+                raise ValueError("Missing search term in CQL query: {0}".format(self.query))
+            return ("clause", value.lower(), relation.lower(), term)
+        return ("clause", "cql.serverchoice", "all", value)
+
+
+def parse(query):
+    return Parser(query).parse()
+
+
+class LocalIndex:
+    """
+    Inverted indexes over a local corpus of titles (e.g. a Store), which
+    allow to search the corpus with CQL queries offline
+    """
+
+    def __init__(self, titles, store=None):
+        self.store = store
+        self.identifiers = []
+        self.records = []
+        self.postings = {name: {} for name in INDEXES}
+        for title in titles:
+            self.add(title)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.stream(), store=store)
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def add(self, title):
+        if not isinstance(title, docs.TitleResponseParser):
+            title = docs.TitleResponseParser(title)
+        pica = title.pica
+        if pica is None:
+            pica = docs.PicaParser({})
+        position = len(self.identifiers)
+        self.identifiers.append(title.identifier)
+        if self.store is None:
+            self.records.append(title.raw)
+        for name in INDEXES:
+            postings = self.postings[name]
+            for value in INDEXES[name](title, pica):
+                postings.setdefault(value, set()).add(position)
+
+    def _lookup(self, name, value):
+        postings = self.postings[name]
+        value = value.lower()
+        if value.endswith("*"):
+            prefix = value.rstrip("*")
+            result = set()
+            for key in postings:
+                if key.startswith(prefix):
+                    result |= postings[key]
+            return result
+        return set(postings.get(value, ()))
+
+    def _clause(self, index, relation, value):
+        name = ALIASES.get(index, index)
+        if name not in INDEXES:
+            raise ValueError("Unsupported CQL index {0}!".format(index))
+        if relation not in RELATIONS:
+            raise ValueError("Unsupported CQL relation {0}!".format(relation))
+        if relation == "<>":
+            return set(range(len(self.identifiers))) - self._lookup(name, value)
+        if relation in ("==", "exact") and name not in WORD_INDEXES:
+            return self._lookup(name, value)
+        if name in WORD_INDEXES:
+            terms = re.findall(r"[\w*]+", value)
+        else:
+            terms = value.split() if relation in ("any", "all") else [value]
+        if not terms:
+            return set()
+        result = self._lookup(name, terms[0])
+        for term in terms[1:]:
+            if relation == "any":
+                result |= self._lookup(name, term)
+            else:
+                result &= self._lookup(name, term)
+        return result
+
+    def evaluate(self, tree):
+        if tree[0] == "clause":
+            return self._clause(tree[1], tree[2], tree[3])
+        left = self.evaluate(tree[1])
+        right = self.evaluate(tree[2])
+        if tree[0] == "and":
+            return left & right
+        if tree[0] == "or":
+            return left | right
+        return left - right
+
+    def find(self, query):
+        """
+        Return the positions of all titles matching query in corpus order
+        """
+        return sorted(self.evaluate(parse(query)))
+
+    def _members(self, positions):
+        if self.store is None:
+            return [self.records[position] for position in positions]
+        identifiers = [self.identifiers[position] for position in positions]
+        found = self.store._titles(identifiers)
+        return [found[identifier].raw for identifier in identifiers if identifier in found]
+
+    def address(self, query, size, page):
+        return "?q={0}&size={1}&page={2}".format(query, size, page)
+
+    def _search(self, query, size, page, positions=None):
+        if positions is None:
+            positions = self.find(query)
+        total = len(positions)
+        pages = max(1, math.ceil(total / size))
+        offset = (page - 1) * size
+        members = self._members(positions[offset:offset + size])
+        view = {
+            "id": self.address(query, size, page),
+            "type": "PartialCollectionView",
+            "totalItems": len(members),
+            "pageIndex": page,
+            "numberOfPages": pages,
+            "offset": offset,
+            "limit": size,
+            "first": self.address(query, size, 1),
+            "last": self.address(query, size, pages)
+        }
+        if page > 1:
+            view["previous"] = self.address(query, size, page - 1)
+        if page < pages:
+            view["next"] = self.address(query, size, page + 1)
+        return docs.SearchResponseParser({
+            "id": self.address(query, size, page),
+            "freetextQuery": query,
+            "totalItems": total,
+            "type": "Collection",
+            "member": members,
+            "view": view
+        })
+
+    def total(self, query):
+        return len(self.find(query))
+
+    def search(self, query, size=10, page=1, fields=None):
+        response = self._search(query, size, page)
+        if len(response.member) > 0:
+            titles = [docs.TitleResponseParser(title) for title in response.member]
+            if fields is not None:
+                return list(docs.project(titles, fields))
+            return titles
+
+    def _stream(self, query, size, page):
+        positions = self.find(query)
+        pages = math.ceil(len(positions) / size)
+        for number in range(page, pages + 1):
+            response = self._search(query, size, number, positions=positions)
+            for title in response.member:
+                yield docs.TitleResponseParser(title)
+
+    def stream(self, query, size=100, page=1, fields=None):
+        titles = self._stream(query, size, page)
+        if fields is not None:
+            titles = docs.project(titles, fields)
+        yield from titles
+
+    def scroll(self, query, size=100, page=1, fields=None):
+        return list(self.stream(query, size=size, page=page, fields=fields))
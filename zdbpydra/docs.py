@@ -8,9 +8,9 @@ https://zeitschriftendatenbank.github.io/pica3plus/ or
 https://zeitschriftendatenbank.de/erschliessung/zdb-format (both in german).
 """
 
+import sys
 import datetime
 from . import utils
-from typing import Generator
 
 
 class BaseParser:
@@ -207,6 +207,7 @@ class TitleResponseParser(ResponseParser):
 
     def __init__(self, data):
         super().__init__(data)
+        self._pica = None
 
     @property
     def _id(self):
@@ -250,9 +251,11 @@ class TitleResponseParser(ResponseParser):
 
     @property
     def _parser_data(self):
-        data = self._field("data")
-        if data is not None:
-            return PicaParser(data)
+        if self._pica is None:
+            data = self._field("data")
+            if data is not None:
+                self._pica = PicaParser(data)
+        return self._pica
 
     @property
     def pica(self):
@@ -270,9 +273,8 @@ class TitleResponseParser(ResponseParser):
 
     @property
     def _csv(self):
-        raw = self.raw
-        if raw is not None:
-            return CsvBuilder(raw)
+        if self.raw is not None:
+            return CsvBuilder(self)
 
     @property
     def csv(self):
@@ -288,6 +290,8 @@ class PicaParser(BaseParser):
     def __init__(self, data):
         self._delim = "|"
         self._sub_delim = "~"
+        self._index = {}
+        self._memo = {}
         super().__init__(data)
 
     @staticmethod
@@ -297,25 +301,64 @@ class PicaParser(BaseParser):
             value = value.replace("@", "")
             return utils.clean_blanks(value)
 
+    @staticmethod
+    def _index_field(fields):
+        """
+        Index the occurrences of a field once
+
+        Each occurrence is a mapping of subfield codes to their values.
+        Values of list items are indexed under code 0.
+        """
+        occurrences = []
+        if isinstance(fields, list):
+            for field in fields:
+                if not isinstance(field, list):
+                    continue
+                subfields = {}
+                for f in field:
+                    if isinstance(f, dict):
+                        for code in f:
+                            subfields.setdefault(code, []).append(f[code])
+                    elif isinstance(f, list) and len(f) > 0:
+                        subfields.setdefault(0, []).append(f[0])
+                occurrences.append(subfields)
+        return occurrences
+
+    def _occurrences(self, name):
+        occurrences = self._index.get(name)
+        if occurrences is None:
+            occurrences = self._index[name] = PicaParser._index_field(self._field(name))
+        return occurrences
+
     def _field_value(self, name, clean=False, repeat=False):
-        value = self._field(name)
-        if repeat:
-            values = []
-        if isinstance(value, list):
-            for v in value:
-                if isinstance(v, list) and len(v) > 0:
-                    if isinstance(v[0], list) and len(v[0]) > 0:
-                        if clean:
-                            if not repeat:
-                                return PicaParser.clean(v[0][0])
-                            values.append(PicaParser.clean(v[0][0]))
-                        else:
-                            if not repeat:
-                                return v[0][0]
-                            values.append(v[0][0])
+        key = ("field", name, clean, repeat)
+        memo = self._memo
+        if key not in memo:
+            memo[key] = self._lead_value(name, clean, repeat)
+        value = memo[key]
+        return list(value) if type(value) is list else value
+
+    def _lead_value(self, name, clean, repeat):
+        fields = self._field(name)
+        values = []
+        if isinstance(fields, list):
+            for field in fields:
+                if isinstance(field, list) and len(field) > 0 \
+                        and isinstance(field[0], list) and len(field[0]) > 0:
+                    value = PicaParser.clean(field[0][0]) if clean else field[0][0]
+                    if not repeat:
+                        return value
+                    values.append(value)
         if repeat and len(values) > 0:
             return values
 
+    @staticmethod
+    def _first_subfield(subfields, *codes):
+        for code in codes:
+            values = subfields.get(code)
+            if values:
+                return PicaParser.clean(values[0])
+
     def _field_values(self, name, clean=False, joined=False):
         values = self._field_value(name, clean=clean, repeat=True)
         if isinstance(values, list) and len(values) > 0:
@@ -323,36 +366,28 @@ class PicaParser(BaseParser):
                 return self._delim.join(values)
             return values
 
-    def _subfields(self, name):
-        fields = self._field(name)
-        if isinstance(fields, list):
-            for field in fields:
-                yield field
-
     def _subfield_value(self, name, subname, repeat=True, clean=False, joined=False):
-        subfields = self._subfields(name)
-        if isinstance(subfields, Generator):
-            if repeat:
-                values = []
-            for subfield in subfields:
-                if repeat:
-                    subvalues = []
-                for field in subfield:
-                    if subname in field:
-                        if repeat:
-                            subvalues.append(field[subname] if not clean
-                                             else PicaParser.clean(field[subname]))
-                        else:
-                            return field[subname] if not clean else PicaParser.clean(field[subname])
-                    elif subname == 0:
-                        if isinstance(field, list):
-                            subvalues.append(field[subname] if not clean
-                                             else PicaParser.clean(field[subname]))
-                if joined:
-                    if len(subvalues) > 0:
-                        values.append(self._sub_delim.join(subvalues))
-                elif repeat:
-                    values.extend(subvalues)
+        key = ("subfield", name, subname, repeat, clean, joined)
+        memo = self._memo
+        if key not in memo:
+            memo[key] = self._subfield_value_index(name, subname, repeat, clean, joined)
+        value = memo[key]
+        return list(value) if type(value) is list else value
+
+    def _subfield_value_index(self, name, subname, repeat, clean, joined):
+        values = []
+        for subfields in self._occurrences(name):
+            subvalues = subfields.get(subname)
+            if not subvalues:
+                continue
+            if clean:
+                subvalues = [PicaParser.clean(v) for v in subvalues]
+            if not repeat:
+                return subvalues[0]
+            if joined:
+                values.append(self._sub_delim.join(subvalues))
+            else:
+                values.extend(subvalues)
         if repeat and len(values) > 0:
             if joined:
                 return self._delim.join(values)
@@ -612,15 +647,10 @@ class PicaParser(BaseParser):
             $S  o = OCLC
         """
         ids = []
-        for field in self._subfields("007I"):
-            provider = None
-            for f in field:
-                if "S" in f:
-                    provider = f["S"]
-            if provider == source:
-                for f in field:
-                    if isinstance(f, list):
-                        ids.append(f[0])
+        for subfields in self._occurrences("007I"):
+            provider = subfields.get("S")
+            if provider and provider[-1] == source:
+                ids.extend(subfields.get(0, []))
         if len(ids) > 0:
             if joined:
                 return self._delim.join(ids)
@@ -922,6 +952,34 @@ class PicaParser(BaseParser):
         if values is not None:
             return self._delim.join(values)
 
+    @property
+    def parallel_relations(self):
+        """
+        039D/4243 – Beziehung auf Manifestationsebene – außer Reproduktionen
+
+        Liste der Beziehungen (eine je Vorkommen) mit den Schlüsseln
+
+            `id` - $0  ZDB-ID (undokumentiert)
+            `idn` - $9  IDN des zu verknüpfenden Bezugswerkes
+            `issn` - $X / $I  ISSN
+            `type` - $n  Materialart, zeitliche Gültigkeit der Beziehung
+            `relation` - $a  Einleitende Wendung
+            `bbg` - $g  Bibliographische Gattung/Status (undokumentiert)
+        """
+        first = PicaParser._first_subfield
+        relations = []
+        for subfields in self._occurrences("039D"):
+            relations.append({
+                "id": first(subfields, 0),
+                "idn": first(subfields, "9"),
+                "issn": first(subfields, "X", "I"),
+                "type": first(subfields, "n"),
+                "relation": first(subfields, "a"),
+                "bbg": first(subfields, "g")
+            })
+        if len(relations) > 0:
+            return relations
+
     @property
     def access_source(self):
         """
@@ -1061,36 +1119,199 @@ class CsvBuilder:
 
     def __init__(self, data):
         self.header = CSV_HEADER
-        self._source = TitleResponseParser(data)
+        if isinstance(data, TitleResponseParser):
+            self._source = data
+        else:
+            self._source = TitleResponseParser(data)
 
     @property
     def row(self):
+        source = self._source
+        pica = source.pica
+        if pica is None:
+            pica = PicaParser({})
         return [
-          self._source.identifier or "",
-          self._source.pica.idn or "",
-          self._source.pica.title or "",
-          self._source.pica.title_supplement_joined or "",
-          self._source.pica.title_responsibility or "",
-          self._source.medium or "",
-          self._source.pica.issn_joined or "",
-          self._source.pica.issn_l or "",
-          self._source.pica.publisher_joined or "",
-          self._source.pica.publisher_place_joined or "",
-          self._source.pica.product_code_joined or "",
-          self._source.pica.zdb_code_joined or "",
-          self._source.pica.bbg or "",
-          self._source.pica.dewey_joined or "",
-          self._source.pica.access_status_joined or "",
-          self._source.pica.access_rights_joined or "",
-          self._source.pica.access_source_joined or "",
-          self._source.pica.parallel_id_joined or "",
-          self._source.pica.parallel_idn_joined or "",
-          self._source.pica.parallel_issn_joined or "",
-          self._source.pica.parallel_bbg_joined or "",
-          self._source.pica.parallel_type_joined or ""
+          source.identifier or "",
+          pica.idn or "",
+          pica.title or "",
+          pica.title_supplement_joined or "",
+          pica.title_responsibility or "",
+          source.medium or "",
+          pica.issn_joined or "",
+          pica.issn_l or "",
+          pica.publisher_joined or "",
+          pica.publisher_place_joined or "",
+          pica.product_code_joined or "",
+          pica.zdb_code_joined or "",
+          pica.bbg or "",
+          pica.dewey_joined or "",
+          pica.access_status_joined or "",
+          pica.access_rights_joined or "",
+          pica.access_source_joined or "",
+          pica.parallel_id_joined or "",
+          pica.parallel_idn_joined or "",
+          pica.parallel_issn_joined or "",
+          pica.parallel_bbg_joined or "",
+          pica.parallel_type_joined or ""
         ]
 
     def output(self, header=False):
         if not header:
             return [self.row]
         return [self.header, self.row]
+
+
+def csv_rows(records, header=False):
+    """
+    Yield csv rows for the given records (raw title data or instances of
+    TitleResponseParser) one at a time, optionally preceded by the header
+    """
+    if header:
+        yield CSV_HEADER
+    for record in records:
+        if record is not None:
+            yield CsvBuilder(record).row
+
+
+INTERNED_FIELDS = [
+  "medium",
+  "type",
+  "pica.bbg",
+  "pica.language",
+  "pica.zdb_code",
+  "pica.product_code",
+  "pica.publisher_place",
+  "pica.url_type",
+  "pica.dewey",
+  "pica.parallel_type",
+  "pica.parallel_bbg",
+  "pica.access_source",
+  "pica.access_rights",
+  "pica.access_norm",
+  "pica.access_status",
+  "pica.first_entry_code",
+  "pica.latest_change_code",
+  "pica.status_change_code"
+]
+
+
+def compact(value, intern=False):
+    """
+    Turn lists into tuples and intern strings (if requested)
+    """
+    if isinstance(value, list):
+        return tuple(compact(v, intern=intern) for v in value)
+    if intern and isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class Record:
+    """
+    Compact record holding the projected fields of a title only,
+    see Projection
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    def __getitem__(self, name):
+        if name not in self._fields:
+            raise KeyError(name)
+        return getattr(self, self.__slots__[self._fields.index(name)])
+
+    def __iter__(self):
+        for slot in self.__slots__:
+            yield getattr(self, slot)
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self._fields == other._fields and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return "Record({0})".format(", ".join(
+            "{0}={1!r}".format(name, value) for name, value in zip(self._fields, self)))
+
+    def as_dict(self):
+        return {name: value for name, value in zip(self._fields, self)}
+
+    @property
+    def raw(self):
+        return self.as_dict()
+
+    @property
+    def row(self):
+        row = []
+        for value in self:
+            if isinstance(value, tuple):
+                value = "|".join(str(v) for v in value if v is not None)
+            row.append("" if value is None else value)
+        return row
+
+
+class Projection:
+    """
+    Materialize the given fields of titles as compact records. Fields are
+    attributes of TitleResponseParser (e.g. identifier, medium) or, prefixed
+    with pica., attributes of PicaParser (e.g. pica.idn, pica.issn_l).
+    List values are stored as tuples, repeated values such as media types,
+    holdings status or product codes are interned.
+    """
+
+    def __init__(self, fields, interned=INTERNED_FIELDS):
+        if isinstance(fields, str):
+            fields = [fields]
+        self.fields = tuple(fields)
+        if len(self.fields) == 0:
+            raise ValueError("No fields to project given!")
+        self._getters = []
+        for name in self.fields:
+            if name.startswith("pica."):
+                attr, source = name[5:], PicaParser
+            else:
+                attr, source = name, TitleResponseParser
+            if attr.startswith("_") or attr in ("pica", "csv") or \
+                    not isinstance(getattr(source, attr, None), property):
+                raise ValueError("Unknown field {0}!".format(name))
+            intern = name in interned or \
+                (name.endswith("_joined") and name[:-7] in interned)
+            self._getters.append((source is PicaParser, attr, intern))
+        slots = tuple(name.replace(".", "_") for name in self.fields)
+        self.record = type("Record", (Record,), {"__slots__": slots, "_fields": self.fields})
+
+    def __call__(self, title):
+        if title is None:
+            return None
+        if not isinstance(title, TitleResponseParser):
+            title = TitleResponseParser(title)
+        pica = None
+        values = []
+        for in_pica, attr, intern in self._getters:
+            if in_pica:
+                if pica is None:
+                    pica = title.pica
+                    if pica is None:
+                        pica = PicaParser({})
+                value = getattr(pica, attr)
+            else:
+                value = getattr(title, attr)
+            values.append(compact(value, intern=intern))
+        return self.record(values)
+
+    @property
+    def header(self):
+        return list(self.fields)
+
+
+def project(titles, fields):
+    """
+    Yield compact records with the given fields of titles, see Projection
+    """
+    projection = Projection(fields)
+    for title in titles:
+        yield projection(title)
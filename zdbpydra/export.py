@@ -0,0 +1,290 @@
+"""
+Incremental writers for exporting titles retrieved from the German Union
+Catalogue of Serials (ZDB) as NDJSON, JSON, CSV or PICA (JSON lines)
+
+Output files ending in .gz or .zst are compressed transparently, the
+latter requires the optional dependency zstandard. Parquet output is
+written by the columnar module and requires an output file.
+"""
+
+import io
+import sys
+import csv
+import gzip
+import itertools
+import collections
+import concurrent.futures
+
+from . import docs
+from . import utils
+from . import columnar
+
+zstandard = None
+
+FORMATS = ["ndjson", "json", "csv", "pica", "parquet"]
+
+BUFFER_SIZE = 1024 * 1024
+
+BATCH_SIZE = 500
+
+# formats whose serialization outweighs passing records to worker processes
+PARALLEL_FORMATS = ["csv"]
+
+
+def import_zstandard():
+    """
+    Import zstandard on first use (i.e. when writing a .zst file)
+    """
+    global zstandard
+    if zstandard is None:
+        try:
+            import zstandard as module
+        except ImportError:
+            raise ImportError("Writing .zst files requires zstandard (pip install zstandard)")
+        zstandard = module
+    return zstandard
+
+
+def open_output(path=None, mode="w"):
+    """
+    Open a buffered text handle for the given path (or stdout if None or -)
+    """
+    if path is None or path == "-":
+        return sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    if path.endswith(".zst"):
+        compressor = import_zstandard().ZstdCompressor()
+        raw = open(path, mode + "b")
+        return io.TextIOWrapper(compressor.stream_writer(raw, closefd=True),
+                                encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="", buffering=BUFFER_SIZE)
+
+
+def close_output(handle):
+    if handle is sys.stdout:
+        handle.flush()
+    else:
+        handle.close()
+
+
+class Writer:
+
+    def __init__(self, handle, pretty=False):
+        self.handle = handle
+        self.pretty = pretty
+        self.count = 0
+
+    def _dumps(self, data):
+        if self.pretty:
+            return utils.json_str_pretty(data)
+        return utils.json_str(data)
+
+    def _serialize(self, record):
+        raise NotImplementedError
+
+    def _write_data(self, data):
+        self.handle.write(data)
+
+    def write(self, record):
+        if record is not None:
+            self._write_data(self._serialize(record))
+            self.count += 1
+
+    def write_serialized(self, data):
+        """
+        Write a record already serialized with _serialize (e.g. by
+        a worker process, see export_parallel)
+        """
+        if data is not None:
+            self._write_data(data)
+            self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self):
+        pass
+
+
+class NdjsonWriter(Writer):
+
+    def _dumps(self, data):
+        return utils.json_str(data)
+
+    def _serialize(self, record):
+        return self._dumps(record.raw) + "\n"
+
+
+class PicaWriter(NdjsonWriter):
+
+    def _serialize(self, record):
+        if isinstance(record, docs.TitleResponseParser):
+            data = record.data
+        else:
+            data = record.raw
+        if data is not None:
+            return self._dumps(data) + "\n"
+        return ""
+
+
+class JsonWriter(Writer):
+
+    def _serialize(self, record):
+        data = self._dumps(record.raw)
+        if self.pretty:
+            data = "\n".join("  " + line for line in data.split("\n"))
+        return data
+
+    def _write_data(self, data):
+        if self.pretty:
+            self.handle.write("[\n" if self.count == 0 else ",\n")
+        else:
+            self.handle.write("[" if self.count == 0 else ", ")
+        self.handle.write(data)
+
+    def close(self):
+        if self.count == 0:
+            self.handle.write("[]\n")
+        elif self.pretty:
+            self.handle.write("\n]\n")
+        else:
+            self.handle.write("]\n")
+
+
+class CsvWriter(Writer):
+
+    def __init__(self, handle, pretty=False, header=True):
+        super().__init__(handle, pretty=pretty)
+        self.header = header
+        self.fields = docs.CSV_HEADER
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter=',', quoting=csv.QUOTE_NONNUMERIC)
+
+    def _format(self, row):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(row)
+        return self.buffer.getvalue()
+
+    def _serialize(self, record):
+        if isinstance(record, docs.Record):
+            self.fields = record._fields
+            return self._format(record.row)
+        return self._format(docs.CsvBuilder(record).row)
+
+    def _write_data(self, data):
+        if self.count == 0 and self.header:
+            self.handle.write(self._format(self.fields))
+        self.handle.write(data)
+
+    def close(self):
+        if self.count == 0 and self.header:
+            self.handle.write(self._format(docs.CSV_HEADER))
+
+
+WRITERS = {
+    "ndjson": NdjsonWriter,
+    "json": JsonWriter,
+    "csv": CsvWriter,
+    "pica": PicaWriter
+}
+
+
+def get_writer(fmt, handle, pretty=False):
+    if fmt not in WRITERS:
+        raise ValueError("Unknown export format {0}!".format(fmt))
+    return WRITERS[fmt](handle, pretty=pretty)
+
+
+def export(records, fmt="ndjson", path=None, pretty=False, workers=1):
+    """
+    Write the given records incrementally to path (or stdout) and
+    return the number of records written. Formats in PARALLEL_FORMATS
+    are serialized by the given number of worker processes, see
+    export_parallel, unless the records are compact records (see
+    docs.Projection), which are cheap to serialize.
+    """
+    if fmt == "parquet":
+        if path is None or path == "-":
+            raise ValueError("Parquet output requires an output file!")
+        return columnar.write_parquet(records, path)
+    if workers > 1 and fmt in PARALLEL_FORMATS:
+        records = iter(records)
+        first = next(records, None)
+        records = itertools.chain([first], records)
+        if not isinstance(first, docs.Record):
+            return export_parallel(records, fmt=fmt, path=path, pretty=pretty,
+                                   workers=workers)
+    handle = open_output(path)
+    try:
+        writer = get_writer(fmt, handle, pretty=pretty)
+        count = writer.write_all(records)
+        writer.close()
+    finally:
+        close_output(handle)
+    return count
+
+
+def _serialize_batch(fmt, pretty, batch):
+    """
+    Serialize a batch of raw title data encoded as JSON array (runs in
+    worker processes, encoding the batch is much cheaper than pickling)
+    """
+    writer = get_writer(fmt, None, pretty=pretty)
+    return [writer._serialize(docs.TitleResponseParser(data))
+            for data in utils.json_loads(batch)]
+
+
+def _raw(record):
+    if isinstance(record, docs.TitleResponseParser):
+        return record.raw
+    if isinstance(record, docs.Record):
+        raise ValueError("Compact records cannot be exported in parallel!")
+    return record
+
+
+def export_parallel(records, fmt="ndjson", path=None, pretty=False, workers=2,
+                    batch_size=BATCH_SIZE):
+    """
+    Write the given records (titles or raw title data) to path (or stdout)
+    like export, but serialize batches of records on a pool of worker
+    processes. Serialized batches are written in order, at most twice as
+    many batches as there are workers are queued between the stages.
+    """
+    if fmt not in WRITERS:
+        raise ValueError("Format {0} cannot be exported in parallel!".format(fmt))
+    handle = open_output(path)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    pending = collections.deque()
+    try:
+        writer = get_writer(fmt, handle, pretty=pretty)
+
+        def drain(limit):
+            while len(pending) > limit:
+                for data in pending.popleft().result():
+                    writer.write_serialized(data)
+
+        batch = []
+        for record in records:
+            if record is None:
+                continue
+            batch.append(_raw(record))
+            if len(batch) >= batch_size:
+                pending.append(executor.submit(_serialize_batch, fmt, pretty,
+                                               utils.json_str(batch)))
+                batch = []
+                drain(2 * workers)
+        if len(batch) > 0:
+            pending.append(executor.submit(_serialize_batch, fmt, pretty,
+                                           utils.json_str(batch)))
+        drain(0)
+        writer.close()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        close_output(handle)
+    return writer.count
@@ -0,0 +1,166 @@
+"""
+Relation graph of titles of the German Union Catalogue of Serials (ZDB)
+
+The Crawler expands seed titles breadth-first along their relations on
+manifestation level (PICA+ 039D, e.g. print and online editions,
+predecessors and successors). Every frontier is fetched in batches of
+ZDB-IDs, several batches at a time, and no title is fetched twice. The
+result is a Graph of titles and edges, whose connected components are
+the title families of the seeds.
+"""
+
+import concurrent.futures
+
+from . import utils
+
+
+class UnionFind:
+
+    def __init__(self):
+        self.parent = {}
+
+    def add(self, node):
+        if node not in self.parent:
+            self.parent[node] = node
+
+    def find(self, node):
+        self.add(node)
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a, b):
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a != root_b:
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+    def components(self):
+        groups = {}
+        for node in self.parent:
+            groups.setdefault(self.find(node), []).append(node)
+        return sorted((sorted(group) for group in groups.values()),
+                      key=lambda group: (-len(group), group[0]))
+
+
+class Graph:
+
+    def __init__(self):
+        self.titles = {}
+        self.depths = {}
+        self.edges = []
+        self._sets = UnionFind()
+
+    def add_node(self, id, depth, title=None):
+        self.titles[id] = title
+        self.depths[id] = depth
+        self._sets.add(id)
+
+    def add_edge(self, source, target, type=None, relation=None):
+        self.edges.append((source, target, type, relation))
+        self._sets.union(source, target)
+
+    @property
+    def nodes(self):
+        return list(self._sets.parent)
+
+    @property
+    def missing(self):
+        """
+        ZDB-IDs which were fetched, but not found
+        """
+        return [id for id, title in self.titles.items() if title is None]
+
+    def components(self):
+        """
+        Return the connected components as sorted lists of ZDB-IDs,
+        largest component first
+        """
+        return self._sets.components()
+
+    def edge_rows(self, header=False):
+        if header:
+            yield ["source", "target", "type", "relation"]
+        for edge in self.edges:
+            yield list(edge)
+
+    def as_dict(self):
+        return {
+            "nodes": len(self.nodes),
+            "fetched": len(self.titles),
+            "missing": self.missing,
+            "edges": [{"source": source, "target": target, "type": type, "relation": relation}
+                      for source, target, type, relation in self.edges],
+            "components": self.components()
+        }
+
+
+def relations(title):
+    """
+    Return the relations (PicaParser.parallel_relations) of the given
+    title which refer to a ZDB-ID
+    """
+    pica = title.pica if title is not None else None
+    if pica is None:
+        return []
+    return [relation for relation in pica.parallel_relations or []
+            if relation["id"]]
+
+
+class Crawler:
+    """
+    Crawl relations from seed ZDB-IDs up to the given depth (0 fetches
+    the seeds only). The source is any object with a method titles(ids)
+    returning a dictionary of ZDB-IDs and titles, e.g. Hydra or Store.
+    """
+
+    def __init__(self, source, depth=1, batch_size=50, workers=4, loglevel=0):
+        self.source = source
+        self.depth = depth
+        self.batch_size = batch_size
+        self.workers = workers
+        self.logger = utils.get_logger("zdbpydra", loglevel=loglevel)
+
+    def _fetch(self, ids):
+        batches = [ids[start:start + self.batch_size]
+                   for start in range(0, len(ids), self.batch_size)]
+        found = {}
+        if self.workers > 1 and len(batches) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for titles in executor.map(self.source.titles, batches):
+                    found.update(titles)
+        else:
+            for batch in batches:
+                found.update(self.source.titles(batch))
+        return found
+
+    def crawl(self, seeds):
+        graph = Graph()
+        frontier = list(dict.fromkeys(seeds))
+        visited = set(frontier)
+        depth = 0
+        while frontier:
+            self.logger.info("Fetch {0} titles at depth {1}".format(len(frontier), depth))
+            found = self._fetch(frontier)
+            following = []
+            for id in frontier:
+                title = found.get(id)
+                graph.add_node(id, depth, title)
+                for relation in relations(title):
+                    target = relation["id"]
+                    graph.add_edge(id, target, relation["type"], relation["relation"])
+                    if depth < self.depth and target not in visited:
+                        visited.add(target)
+                        following.append(target)
+            frontier = following
+            depth += 1
+        return graph
+
+
+def crawl(source, seeds, depth=1, batch_size=50, workers=4):
+    return Crawler(source, depth=depth, batch_size=batch_size, workers=workers).crawl(seeds)
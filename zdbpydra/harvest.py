@@ -0,0 +1,141 @@
+"""
+Resumable harvesting of result sets from the German Union Catalogue of Serials (ZDB)
+
+A checkpoint is written after every page (query, page, offset, records
+written and output position), so an interrupted harvest can be resumed
+from the last page that was written completely.
+"""
+
+import os
+
+from . import export
+from . import utils
+
+
+class Checkpoint:
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def load(self):
+        if self.exists():
+            with open(self.path, encoding="utf-8") as checkpoint_file:
+                return utils.json_loads(checkpoint_file.read())
+
+    def save(self, state):
+        temp_path = "{0}.tmp".format(self.path)
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(utils.json_str_pretty(state))
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
+
+    def check(self, query, size, fmt):
+        """
+        Raise a ValueError if the saved state belongs to a different harvest
+        """
+        state = self.load()
+        if state is not None:
+            if state["query"] != query or state["size"] != size or state["format"] != fmt:
+                raise ValueError("Checkpoint {0} belongs to a different harvest!".format(
+                    self.path))
+        return state
+
+
+def check_output(path, fmt):
+    """
+    Raise a ValueError if a harvest cannot be written to path in format fmt
+    """
+    if path is None or path == "-" or path.endswith((".gz", ".zst")):
+        raise ValueError("Harvesting requires an uncompressed output file!")
+    if fmt not in export.WRITERS:
+        raise ValueError("Harvesting does not support format {0}!".format(fmt))
+
+
+class Harvester:
+
+    def __init__(self, hydra, query, size=100, checkpoint=None):
+        self.hydra = hydra
+        self.query = query
+        self.size = size
+        self.checkpoint = checkpoint
+        self.logger = hydra.logger
+
+    def _state(self, fmt, resume):
+        state = None
+        if resume and self.checkpoint is not None:
+            state = self.checkpoint.check(self.query, self.size, fmt)
+        if state is not None:
+            return state
+        return {
+            "query": self.query,
+            "size": self.size,
+            "format": fmt,
+            "page": 0,
+            "offset": 0,
+            "written": 0,
+            "position": 0,
+            "total": None,
+            "complete": False
+        }
+
+    def _save(self, state):
+        if self.checkpoint is not None:
+            self.checkpoint.save(state)
+
+    def run(self, path, fmt="ndjson", pretty=False, resume=False):
+        """
+        Harvest all pages into the file at path and return the final
+        state, whose key complete tells whether all records were written
+        """
+        check_output(path, fmt)
+        state = self._state(fmt, resume)
+        if state["complete"]:
+            return state
+        resumed = state["page"] > 0 and os.path.isfile(path)
+        handle = export.open_output(path, mode="a" if resumed else "w")
+        try:
+            if resumed:
+                handle.truncate(state["position"])
+                self.logger.info("Resume harvest of {0} after page {1}".format(
+                    self.query, state["page"]))
+            writer = export.get_writer(fmt, handle, pretty=pretty)
+            writer.count = state["written"] if resumed else 0
+            if not resumed:
+                state.update({"page": 0, "offset": 0, "written": 0, "position": 0})
+            while True:
+                page = state["page"] + 1
+                result = self.hydra._search(self.query, self.size, page)
+                if result is None:
+                    self.logger.error("Harvest of {0} stopped at page {1}!".format(
+                        self.query, page))
+                    break
+                state["total"] = result.total_items
+                writer.write_all(self.hydra._members(result))
+                handle.flush()
+                view = result.view__parser
+                state["page"] = page
+                state["offset"] = view.offset if view is not None else None
+                state["written"] = writer.count
+                state["position"] = handle.tell()
+                if result.view_next is None:
+                    state["complete"] = state["written"] >= state["total"]
+                    if state["complete"]:
+                        writer.close()
+                        handle.flush()
+                        state["position"] = handle.tell()
+                    else:
+                        self.logger.error(
+                            "Harvest of {0} truncated, {1} of {2} records written!".format(
+                                self.query, state["written"], state["total"]))
+                    self._save(state)
+                    break
+                self._save(state)
+        finally:
+            export.close_output(handle)
+        return state
@@ -0,0 +1,208 @@
+"""
+Request instrumentation for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+Clients report a RequestEvent for every request to their observers. The
+MetricsCollector aggregates these events in memory (histograms of
+latency phases, counters of statuses, bytes, retries, cache hits and
+requests coalesced with identical requests in flight) and can export
+them in the Prometheus text format.
+"""
+
+import os
+import math
+import threading
+
+TEMPLATES = {
+    "context": "/api/context/zdb.jsonld",
+    "title": "/api/tit/{id}.jsonld",
+    "search": "/api/tit.jsonld?q={query}"
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+PHASES = ["connect", "ttfb", "download", "elapsed"]
+
+
+class RequestEvent:
+
+    def __init__(self, url, endpoint="search"):
+        self.url = url
+        self.endpoint = endpoint
+        self.template = TEMPLATES.get(endpoint, endpoint)
+        self.status = None
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+        self.elapsed = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.coalesced = False
+
+    @property
+    def ok(self):
+        return self.cache_hit or self.status == 200
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class Observer:
+    """
+    Base class for observers of requests made by a client
+    """
+
+    def on_request(self, event):
+        pass
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile by linear interpolation within buckets
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            if not math.isinf(bound):
+                lower = bound
+        return lower
+
+    @property
+    def mean(self):
+        if self.count:
+            return self.sum / self.count
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsCollector(Observer):
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.requests = {}
+        self.bytes = {}
+        self.retries = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.coalesced_bytes = 0
+        self._lock = threading.Lock()
+
+    def _histogram(self, endpoint, phase):
+        key = (endpoint, phase)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(self.buckets)
+        return self.histograms[key]
+
+    def on_request(self, event):
+        with self._lock:
+            if event.coalesced:
+                self.coalesced += 1
+                self.coalesced_bytes += event.bytes
+                status = "coalesced"
+            elif event.cache_hit:
+                self.cache_hits += 1
+                status = "cache"
+            else:
+                status = str(event.status) if event.status is not None else "error"
+                for phase in PHASES:
+                    self._histogram(event.endpoint, phase).observe(getattr(event, phase))
+                self.bytes[event.endpoint] = self.bytes.get(event.endpoint, 0) + event.bytes
+                self.retries += event.retries
+            key = (event.endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            latency = {}
+            for (endpoint, phase), histogram in self.histograms.items():
+                latency.setdefault(endpoint, {})[phase] = {
+                    "count": histogram.count,
+                    "mean": histogram.mean,
+                    "p50": histogram.quantile(0.5),
+                    "p90": histogram.quantile(0.9),
+                    "p99": histogram.quantile(0.99)
+                }
+            return {
+                "requests": {"{0} {1}".format(*key): count
+                             for key, count in self.requests.items()},
+                "bytes": dict(self.bytes),
+                "retries": self.retries,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "coalesced_bytes": self.coalesced_bytes,
+                "latency": latency
+            }
+
+    def prometheus(self):
+        """
+        Return metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            lines.append("# TYPE zdbpydra_requests_total counter")
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append('zdbpydra_requests_total{{endpoint="{0}",status="{1}"}} {2}'.format(
+                    endpoint, status, count))
+            lines.append("# TYPE zdbpydra_response_bytes_total counter")
+            for endpoint, count in sorted(self.bytes.items()):
+                lines.append('zdbpydra_response_bytes_total{{endpoint="{0}"}} {1}'.format(
+                    endpoint, count))
+            lines.append("# TYPE zdbpydra_retries_total counter")
+            lines.append("zdbpydra_retries_total {0}".format(self.retries))
+            lines.append("# TYPE zdbpydra_cache_hits_total counter")
+            lines.append("zdbpydra_cache_hits_total {0}".format(self.cache_hits))
+            lines.append("# TYPE zdbpydra_coalesced_total counter")
+            lines.append("zdbpydra_coalesced_total {0}".format(self.coalesced))
+            lines.append("# TYPE zdbpydra_coalesced_bytes_total counter")
+            lines.append("zdbpydra_coalesced_bytes_total {0}".format(self.coalesced_bytes))
+            lines.append("# TYPE zdbpydra_request_seconds histogram")
+            for (endpoint, phase), histogram in sorted(self.histograms.items()):
+                labels = 'endpoint="{0}",phase="{1}"'.format(endpoint, phase)
+                for bound, count in histogram.cumulative():
+                    bound = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append('zdbpydra_request_seconds_bucket{{{0},le="{1}"}} {2}'.format(
+                        labels, bound, count))
+                lines.append("zdbpydra_request_seconds_sum{{{0}}} {1}".format(
+                    labels, histogram.sum))
+                lines.append("zdbpydra_request_seconds_count{{{0}}} {1}".format(
+                    labels, histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write metrics to path atomically (e.g. for the textfile collector
+        of the Prometheus node exporter)
+        """
+        temp_path = "{0}.tmp".format(path)
+        with open(temp_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.prometheus())
+        os.replace(temp_path, path)
@@ -0,0 +1,70 @@
+"""
+Partitioning of queries to the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+A broad query is split into sub-queries by combining it with disjoint
+clauses (e.g. one per medium, bibliographic type or range of years). A
+split is accepted only if the totals of the sub-queries add up to the
+total of the query. Equal sums do not rule out that titles matched by
+two sub-queries make up for titles matched by none, hence the number
+of distinct titles harvested is compared with the total afterwards
+(see Hydra.harvest).
+"""
+
+import concurrent.futures
+
+from . import utils
+
+MEDIA = ["print", "online", "audiovisual", "braille", "microform", "electronic"]
+
+# first position of the bibliographic type (Bibliographische Gattung)
+BBG = ["A", "B", "E", "G", "K", "M", "O", "S", "Z"]
+
+PARTITIONS = {
+    "medium": ["medium={0}".format(medium) for medium in MEDIA],
+    "bbg": ["bbg={0}*".format(bbg) for bbg in BBG]
+}
+
+
+def years(start, end, step=10, index="jhr"):
+    """
+    Return clauses for ranges of years of the given index from start
+    to end (exclusive), with open ranges before start and from end
+    """
+    clauses = ["{0}<{1}".format(index, start)]
+    for lower in range(start, end, step):
+        upper = min(lower + step, end)
+        clauses.append("{0}>={1} and {0}<{2}".format(index, lower, upper))
+    clauses.append("{0}>={1}".format(index, end))
+    return clauses
+
+
+def get_clauses(partitions):
+    if isinstance(partitions, str):
+        if partitions not in PARTITIONS:
+            raise ValueError("Unknown partitioning {0}!".format(partitions))
+        return list(PARTITIONS[partitions])
+    return list(partitions)
+
+
+def subqueries(query, partitions):
+    return ["({0}) and ({1})".format(query, clause) for clause in get_clauses(partitions)]
+
+
+def split(hydra, query, partitions, workers=4):
+    """
+    Split the query into sub-queries and return a list of pairs of
+    non-empty sub-queries and their totals, or None if the totals of the
+    sub-queries do not add up to the total of the query
+    """
+    logger = utils.get_logger()
+    queries = subqueries(query, partitions)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        total = executor.submit(hydra.total, query)
+        totals = list(executor.map(hydra.total, queries))
+        total = total.result()
+    if sum(totals) != total:
+        logger.warning("Partitions of query {0} match {1} instead of {2} titles.".format(
+            query, sum(totals), total))
+        return None
+    return [(subquery, subtotal) for subquery, subtotal in zip(queries, totals)
+            if subtotal > 0]
@@ -0,0 +1,172 @@
+"""
+Request policy for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+Bundles connect/read timeouts, retries with exponential backoff and jitter,
+a retry budget and a client-side token bucket rate limiter, which can be
+shared by all threads using the same client.
+"""
+
+import time
+import random
+import threading
+import email.utils
+
+import requests
+
+from . import utils
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+THROTTLE_STATUS = (429, 503)
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, block until it is available and return the seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def retry_after(response):
+    """
+    Seconds to wait according to the Retry-After header of response (if any)
+    """
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, date.timestamp() - time.time())
+
+
+class RequestPolicy:
+
+    def __init__(self, connect_timeout=10, read_timeout=60, retries=3,
+                 backoff=0.5, max_backoff=60, jitter=True, retry_budget=None,
+                 rate=None, burst=None, retry_status=RETRY_STATUS):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_budget = retry_budget
+        self.retry_status = retry_status
+        self.limiter = TokenBucket(rate, burst=burst) if rate else None
+        self.requests = 0
+        self.retried = 0
+        self.throttled = 0
+        self.limited = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    @property
+    def stats(self):
+        return {"requests": self.requests, "retries": self.retried,
+                "throttles": self.throttled, "rate_limited": self.limited}
+
+    def delay(self, attempt, response=None):
+        wait = retry_after(response)
+        if wait is not None:
+            return min(wait, self.max_backoff)
+        wait = min(self.max_backoff, self.backoff * (2 ** attempt))
+        if self.jitter:
+            wait = random.uniform(0, wait)
+        return wait
+
+    def _retry(self, attempt):
+        if attempt >= self.retries:
+            return False
+        with self._lock:
+            if self.retry_budget is not None and self.retried >= self.retry_budget:
+                return False
+            self.retried += 1
+        return True
+
+    @property
+    def last_retries(self):
+        """
+        Number of retries of the latest request made by the current thread
+        """
+        return getattr(self._local, "retries", 0)
+
+    @property
+    def last_headers_received(self):
+        """
+        Time (perf_counter) the headers of the latest response to a request
+        made by the current thread were received, if any
+        """
+        return getattr(self._local, "headers_received", None)
+
+    def request(self, session, url, headers={}, stream=False, read=False):
+        """
+        Send a GET request and retry it according to the policy. If read
+        is set, the body of the response is read within the retry loop,
+        hence errors while downloading the body are retried as well.
+        """
+        logger = utils.get_logger()
+        attempt = 0
+        self._local.headers_received = None
+        while True:
+            self._local.retries = attempt
+            if self.limiter is not None and self.limiter.acquire() > 0:
+                with self._lock:
+                    self.limited += 1
+            with self._lock:
+                self.requests += 1
+            response = None
+            try:
+                response = session.get(url, headers=headers, timeout=self.timeout,
+                                       stream=stream)
+                self._local.headers_received = time.perf_counter()
+                if read and response.status_code not in self.retry_status:
+                    response.content
+            except requests.exceptions.RequestException as err:
+                logger.error(err.__class__.__name__)
+                if response is not None:
+                    response.close()
+                    response = None
+            else:
+                if response.status_code not in self.retry_status:
+                    return response
+                if response.status_code in THROTTLE_STATUS:
+                    with self._lock:
+                        self.throttled += 1
+            if not self._retry(attempt):
+                return response
+            if response is not None:
+                response.close()
+            wait = self.delay(attempt, response)
+            logger.warning("Retry request to {0} in {1:.2f} seconds.".format(url, wait))
+            time.sleep(wait)
+            attempt += 1
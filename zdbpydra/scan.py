@@ -0,0 +1,127 @@
+"""
+Incremental parser for result pages of the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+A PageScanner reads the body of a search response chunk by chunk and
+decodes every element of the member array as soon as it is complete,
+hence members can be consumed before the whole page has been received.
+All other fields of the page (totalItems, view, ...) are collected in
+PageScanner.fields while scanning.
+
+Values are decoded with the raw_decode method of the JSON decoder from
+the standard library, which reports where a value ends.
+"""
+
+import json
+import codecs
+
+CHUNK_SIZE = 65536
+
+WHITESPACE = " \t\n\r"
+
+
+class ScanError(ValueError):
+    pass
+
+
+class PageScanner:
+
+    def __init__(self, chunks, array="member"):
+        self.chunks = iter(chunks)
+        self.array = array
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.bytes = 0
+        self.fields = {}
+
+    def _fill(self):
+        for chunk in self.chunks:
+            if chunk:
+                self.bytes += len(chunk)
+                self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk)
+                self.pos = 0
+                return True
+        return False
+
+    def _grow(self):
+        """
+        Read at least as much data as is buffered, hence values which
+        span many chunks are decoded a logarithmic number of times
+        """
+        target = 2 * (len(self.buffer) - self.pos)
+        grown = False
+        while self._fill():
+            grown = True
+            if len(self.buffer) >= target:
+                break
+        return grown
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ScanError("Unexpected end of JSON data")
+
+    def _expect(self, token):
+        if self._peek() != token:
+            raise ScanError("Expected {0} at byte {1}".format(token, self.bytes))
+        self.pos += 1
+
+    def _value(self):
+        """
+        Decode the next complete JSON value, reading more data as long as
+        the value is incomplete (values must be followed by another token,
+        otherwise a number could have been cut off)
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as err:
+                if not self._grow():
+                    raise ScanError(str(err))
+                continue
+            if end < len(self.buffer) or not self._fill():
+                self.pos = end
+                return value
+
+    def members(self):
+        """
+        Yield the elements of the member array one by one
+        """
+        self._expect("{")
+        while True:
+            token = self._peek()
+            if token == "}":
+                self.pos += 1
+                return
+            if token == ",":
+                self.pos += 1
+                continue
+            key = self._value()
+            self._expect(":")
+            if key == self.array and self._peek() == "[":
+                self.pos += 1
+                self.fields[key] = None
+                while True:
+                    token = self._peek()
+                    if token == "]":
+                        self.pos += 1
+                        break
+                    if token == ",":
+                        self.pos += 1
+                        continue
+                    yield self._value()
+            else:
+                self.fields[key] = self._value()
+
+
+def scan_members(chunks, array="member"):
+    """
+    Yield members from an iterable of byte chunks of a result page
+    """
+    return PageScanner(chunks, array=array).members()
@@ -0,0 +1,210 @@
+"""
+Caching proxy for the Hydra-based JSON API of the German Union Catalogue of Serials (ZDB)
+
+    zdbpydra serve --port 8000 --cache-dir ~/.cache/zdbpydra
+
+serves the routes of the API
+
+    /api/tit/{id}.jsonld
+    /api/tit.jsonld?q={query}&size={size}&page={page}
+    /api/context/zdb.jsonld
+
+from a single Hydra client with a shared response cache and pooled
+connections. Concurrent requests for the same upstream URL are coalesced
+into one upstream request. Links to further pages of search results
+point to the proxy. Metrics are served in the Prometheus text format at
+
+    /metrics
+"""
+
+import os
+import re
+import sys
+import argparse
+import threading
+import http.server
+import urllib.parse
+
+from . import utils
+from .client import Hydra
+from .cache import ResponseCache
+from .metrics import MetricsCollector
+from . import __version__
+
+UPSTREAM = "https://zeitschriftendatenbank.de/api"
+
+TITLE_ROUTE = re.compile(r"^/api/tit/(.+)\.jsonld$")
+
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "zdbpydra/{0}".format(__version__)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug("{0} {1}".format(self.address_string(), format % args))
+
+    def _send(self, payload, content_type, status=200):
+        payload = payload.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.count(self.route, status)
+
+    def _send_json(self, data, status=200):
+        self._send(utils.json_str(data), "application/ld+json", status=status)
+
+    def _send_error(self, message, status):
+        self._send_json({"error": message}, status=status)
+
+    def _proxy(self, url, endpoint):
+        data = self.server.fetch(url, endpoint)
+        if data is None:
+            return self._send_error("Upstream request failed", 502)
+        if endpoint == "search":
+            host = self.headers.get("Host") or "{0}:{1}".format(*self.server.server_address[:2])
+            data = self.server.rewrite(data, "http://{0}/api/tit".format(host))
+        self._send_json(data)
+
+    def do_GET(self):
+        hydra = self.server.hydra
+        url = urllib.parse.urlparse(self.path)
+        match = TITLE_ROUTE.match(url.path)
+        if match:
+            self.route = "title"
+            id = urllib.parse.unquote(match.group(1))
+            if any(char in id for char in "/?#"):
+                return self._send_error("Invalid id {0}".format(id), 400)
+            url = "{0}/{1}.jsonld".format(hydra.BASE_URL, urllib.parse.quote(id, safe=""))
+            return self._proxy(url, "title")
+        if url.path == "/api/tit.jsonld":
+            self.route = "search"
+            params = urllib.parse.parse_qs(url.query)
+            query = params.get("q", [""])[0]
+            if not query:
+                return self._send_error("Missing parameter q", 400)
+            try:
+                size = int(params.get("size", ["10"])[0])
+                page = int(params.get("page", ["1"])[0])
+            except ValueError:
+                return self._send_error("Parameters size and page must be integers", 400)
+            url = hydra.address(urllib.parse.quote(query, safe=""), size, page)
+            return self._proxy(url, "search")
+        if url.path == "/api/context/zdb.jsonld":
+            self.route = "context"
+            return self._proxy(hydra.CONTEXT_URL, "context")
+        if url.path == "/metrics":
+            self.route = "metrics"
+            return self._send(self.server.prometheus(), "text/plain; version=0.0.4")
+        self.route = "other"
+        self._send_error("Not found", 404)
+
+
+class ProxyServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, hydra, host="127.0.0.1", port=8000, metrics=None):
+        super().__init__((host, port), ProxyHandler)
+        self.hydra = hydra
+        self.metrics = metrics
+        self.logger = hydra.logger
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def count(self, route, status):
+        key = (route, status)
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def fetch(self, url, endpoint):
+        return self.hydra._fetch(url, endpoint=endpoint)
+
+    def rewrite(self, data, base_url):
+        """
+        Return a copy of a search response whose links to pages point to base_url
+        """
+        upstream = self.hydra.BASE_URL
+
+        def local(value):
+            if isinstance(value, str) and value.startswith(upstream):
+                return base_url + value[len(upstream):]
+            return value
+
+        data = dict(data)
+        data["id"] = local(data.get("id"))
+        if isinstance(data.get("view"), dict):
+            data["view"] = {key: local(value) for key, value in data["view"].items()}
+        return data
+
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE zdbpydra_proxy_requests_total counter")
+            for (route, status), count in sorted(self.requests.items()):
+                lines.append('zdbpydra_proxy_requests_total{{route="{0}",status="{1}"}} {2}'.format(
+                    route, status, count))
+        cache = self.hydra.cache
+        if cache is not None:
+            stats = cache.stats
+            lines.append("# TYPE zdbpydra_cache_lookups_total counter")
+            lines.append('zdbpydra_cache_lookups_total{{result="hit"}} {0}'.format(stats["hits"]))
+            lines.append('zdbpydra_cache_lookups_total{{result="miss"}} {0}'.format(stats["misses"]))
+            lines.append("# TYPE zdbpydra_cache_bytes gauge")
+            lines.append("zdbpydra_cache_bytes {0}".format(stats["size"]))
+        text = "\n".join(lines) + "\n"
+        if self.metrics is not None:
+            text += self.metrics.prometheus()
+        return text
+
+
+def main(argv=None):
+    serve_cli = argparse.ArgumentParser(
+        "zdbpydra serve", description="Serve a caching proxy of the ZDB Hydra API")
+    serve_cli.add_argument("--host", type=str, default="127.0.0.1",
+                           help="address to listen on (default: 127.0.0.1)")
+    serve_cli.add_argument("--port", type=int, default=8000,
+                           help="port to listen on (default: 8000)")
+    serve_cli.add_argument("--upstream", type=str, default=UPSTREAM,
+                           help="base url of the upstream api (default: {0})".format(UPSTREAM))
+    serve_cli.add_argument("--cache-dir", type=str, default=None,
+                           help="directory of persistent response cache (default: in memory)")
+    serve_cli.add_argument("--cache-ttl", type=int, default=None,
+                           help="seconds to cache title and search responses (default: 1 day / 1 hour)")
+    serve_cli.add_argument("--pool-size", type=int, default=20,
+                           help="connections kept alive to upstream (default: 20)")
+    serve_cli.add_argument("--loglevel", type=int, default=20,
+                           help="log level (default: 20)")
+    args = serve_cli.parse_args(argv)
+    ttl = None
+    if args.cache_ttl is not None:
+        ttl = {"title": args.cache_ttl, "search": args.cache_ttl}
+    if args.cache_dir is not None:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        cache = ResponseCache(args.cache_dir, ttl=ttl)
+    else:
+        cache = ResponseCache(":memory:", ttl=ttl)
+    metrics = MetricsCollector()
+    upstream = args.upstream.rstrip("/")
+    headers = {"User-Agent": "zdbpydra-serve {0}".format(__version__)}
+    with Hydra(headers=headers, loglevel=args.loglevel, pool_size=args.pool_size,
+               cache=cache, observers=[metrics], coalesce=True) as hydra:
+        hydra.BASE_URL = "{0}/tit".format(upstream)
+        hydra.CONTEXT_URL = "{0}/context/zdb.jsonld".format(upstream)
+        server = ProxyServer(hydra, host=args.host, port=args.port, metrics=metrics)
+        hydra.logger.info("Serving {0} at http://{1}:{2}".format(
+            upstream, *server.server_address[:2]))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
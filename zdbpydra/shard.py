@@ -0,0 +1,170 @@
+"""
+Deterministic sharding of result sets from the German Union Catalogue of Serials (ZDB)
+
+Shard i of N (0 <= i < N) takes every page p of the result set with
+(p - 1) mod N == i, hence N shards harvest disjoint subsets of the pages
+without any coordination. Every shard keeps a manifest (query, page
+size, total, pages taken, records expected and written), which can be
+saved next to its output and is used to check the completeness of all
+shards before merging them.
+"""
+
+from . import utils
+from .harvest import Checkpoint
+
+MANIFEST_KEYS = ["query", "size", "shard", "shards", "first_page", "total",
+                 "expected", "records", "complete"]
+
+
+def parse_shard(value):
+    """
+    Parse a shard given as i/N
+    """
+    try:
+        index, count = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise ValueError("Invalid shard {0}, expected i/N!".format(value))
+    return validate(index, count)
+
+
+def validate(index, count):
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("Invalid shard {0}/{1}, expected 0 <= i < N!".format(index, count))
+    return index, count
+
+
+def shard_pages(number_of_pages, index, count, page=1):
+    return [number for number in range(page, number_of_pages + 1)
+            if (number - 1) % count == index]
+
+
+def expected_records(total, size, pages):
+    return sum(max(0, min(size, total - (number - 1) * size)) for number in pages)
+
+
+class Shard:
+
+    def __init__(self, hydra, query, index, count, size=100, page=1):
+        self.hydra = hydra
+        self.query = query
+        self.index, self.count = validate(index, count)
+        self.size = size
+        self.page = page
+        self.manifest = {
+            "query": query,
+            "size": size,
+            "shard": self.index,
+            "shards": self.count,
+            "first_page": page,
+            "total": None,
+            "number_of_pages": None,
+            "pages": [],
+            "pages_done": 0,
+            "expected": None,
+            "records": 0,
+            "complete": False
+        }
+
+    def _page(self, result):
+        for title in self.hydra._members(result):
+            self.manifest["records"] += 1
+            yield title
+        self.manifest["pages_done"] += 1
+
+    def stream(self):
+        manifest = self.manifest
+        result = None
+        if (self.page - 1) % self.count == self.index:
+            result = self.hydra._search(self.query, self.size, self.page)
+            if result is None:
+                return
+            total = result.total_items or 0
+        else:
+            total = self.hydra.total(self.query)
+        number_of_pages = -(-total // self.size)
+        pages = shard_pages(number_of_pages, self.index, self.count, page=self.page)
+        manifest.update({
+            "total": total,
+            "number_of_pages": number_of_pages,
+            "pages": pages,
+            "expected": expected_records(total, self.size, pages)
+        })
+        for number in pages:
+            if number != self.page or result is None:
+                result = self.hydra._search(self.query, self.size, number)
+                if result is None:
+                    return
+            yield from self._page(result)
+        manifest["complete"] = manifest["records"] == manifest["expected"]
+
+    def save(self, path):
+        Checkpoint(path).save(self.manifest)
+
+
+def check(manifests, names=None):
+    """
+    Check manifests of all shards of a harvest for completeness and
+    return a summary, whose key complete tells whether they can be merged.
+    Manifests which are None (missing or unreadable) are reported by
+    their names (e.g. paths) as problems.
+    """
+    if names is None:
+        names = [str(number) for number in range(len(manifests))]
+    problems = ["Manifest {0} is missing or unreadable".format(name)
+                for name, manifest in zip(names, manifests) if manifest is None]
+    manifests = [manifest for manifest in manifests if manifest is not None]
+    if len(manifests) == 0:
+        return {"complete": False, "records": 0, "expected": None,
+                "problems": problems or ["No manifests given"]}
+    first = manifests[0]
+    for key in ["query", "size", "shards", "first_page", "total"]:
+        values = set(manifest[key] for manifest in manifests)
+        if len(values) > 1:
+            problems.append("Shards differ in {0}: {1}".format(key, sorted(values, key=str)))
+    shards = [manifest["shard"] for manifest in manifests]
+    missing = sorted(set(range(first["shards"])) - set(shards))
+    if missing:
+        problems.append("Missing shards: {0}".format(missing))
+    if len(shards) != len(set(shards)):
+        problems.append("Duplicate shards")
+    for manifest in manifests:
+        if not manifest["complete"]:
+            problems.append("Shard {0} is incomplete ({1} of {2} records)".format(
+                manifest["shard"], manifest["records"], manifest["expected"]))
+    records = sum(manifest["records"] for manifest in manifests)
+    expected = max(0, (first["total"] or 0) - (first["first_page"] - 1) * first["size"])
+    if records != expected:
+        problems.append("Shards hold {0} of {1} records".format(records, expected))
+    return {
+        "complete": len(problems) == 0,
+        "records": records,
+        "expected": expected,
+        "problems": problems
+    }
+
+
+def load_manifest(path):
+    """
+    Load the manifest saved at path, or return None if it is missing or
+    unreadable
+    """
+    try:
+        manifest = Checkpoint(path).load()
+    except (OSError, ValueError) + tuple(utils.json_errors()):
+        return None
+    if not isinstance(manifest, dict) or any(key not in manifest for key in MANIFEST_KEYS):
+        return None
+    return manifest
+
+
+def load_manifests(paths):
+    return [load_manifest(path) for path in paths]
+
+
+def stream(hydra, query, shard, size=100, page=1):
+    """
+    Stream the titles of the given shard (a pair i, N) of the query
+    """
+    index, count = shard
+    return Shard(hydra, query, index, count, size=size, page=page).stream()
+
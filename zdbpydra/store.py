@@ -0,0 +1,211 @@
+"""
+Local mirror store for titles retrieved from the German Union Catalogue of Serials (ZDB)
+
+Titles are kept in a single SQLite file together with secondary indexes
+on ZDB-ID, IDN, ISSN, ISSN-L, OCLC number and parallel ZDB-IDs (039D),
+which allows to answer lookups locally instead of querying the API.
+"""
+
+import re
+import sqlite3
+import threading
+
+from . import docs
+from . import utils
+
+STORE_KEYS = {
+    "idn": lambda pica: [pica.idn],
+    "issn": lambda pica: pica.issn_lazy,
+    "issn_l": lambda pica: [pica.issn_l],
+    "oclc": lambda pica: pica.oclc,
+    "parallel_id": lambda pica: pica.parallel_id
+}
+
+
+def normalize_issn(issn):
+    if isinstance(issn, str):
+        issn = re.sub(r"[^0-9Xx]", "", issn).upper()
+        if len(issn) == 8:
+            return "{0}-{1}".format(issn[:4], issn[4:])
+
+
+def title_keys(title):
+    """
+    Yield (kind, value) pairs of secondary keys for the given title
+    """
+    pica = title.pica
+    if pica is None:
+        return
+    for kind in STORE_KEYS:
+        values = STORE_KEYS[kind](pica)
+        if not values:
+            continue
+        for value in values:
+            if kind in ("issn", "issn_l"):
+                value = normalize_issn(value)
+            if value:
+                yield kind, value
+
+
+class Store:
+
+    def __init__(self, path, loglevel=0):
+        self.path = path
+        self.logger = utils.get_logger("zdbpydra", loglevel=loglevel)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS titles (identifier TEXT PRIMARY KEY, data TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS keys (kind TEXT, value TEXT, identifier TEXT)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS keys_value ON keys (kind, value)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS keys_identifier ON keys (identifier)")
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def _put(self, title):
+        identifier = title.identifier
+        if identifier is None:
+            return False
+        self._db.execute("DELETE FROM keys WHERE identifier = ?", (identifier,))
+        self._db.execute("INSERT OR REPLACE INTO titles VALUES (?, ?)",
+                         (identifier, utils.json_str(title.raw)))
+        self._db.executemany("INSERT INTO keys VALUES (?, ?, ?)",
+                             [(kind, value, identifier)
+                              for kind, value in title_keys(title)])
+        return True
+
+    def put(self, title):
+        if not isinstance(title, docs.TitleResponseParser):
+            title = docs.TitleResponseParser(title)
+        with self._lock:
+            stored = self._put(title)
+            self._db.commit()
+        return stored
+
+    def _put_batch(self, batch):
+        count = 0
+        with self._lock:
+            for title in batch:
+                if self._put(title):
+                    count += 1
+            self._db.commit()
+        return count
+
+    def load(self, titles, batch_size=1000):
+        """
+        Store the given titles (e.g. from Hydra.stream), committing
+        every batch_size titles, and return the number of titles stored
+        """
+        count = 0
+        batch = []
+        for title in titles:
+            if title is None:
+                continue
+            if not isinstance(title, docs.TitleResponseParser):
+                title = docs.TitleResponseParser(title)
+            batch.append(title)
+            if len(batch) >= batch_size:
+                count += self._put_batch(batch)
+                batch = []
+        if batch:
+            count += self._put_batch(batch)
+        return count
+
+    def delete(self, identifier):
+        with self._lock:
+            self._db.execute("DELETE FROM keys WHERE identifier = ?", (identifier,))
+            self._db.execute("DELETE FROM titles WHERE identifier = ?", (identifier,))
+            self._db.commit()
+
+    def _titles(self, identifiers):
+        identifiers = list(identifiers)
+        result = {}
+        with self._lock:
+            for start in range(0, len(identifiers), 500):
+                chunk = identifiers[start:start + 500]
+                rows = self._db.execute(
+                    "SELECT identifier, data FROM titles WHERE identifier IN ({0})".format(
+                        ",".join("?" * len(chunk))), chunk).fetchall()
+                for identifier, data in rows:
+                    result[identifier] = docs.TitleResponseParser(utils.json_loads(data))
+        return result
+
+    def title(self, id, pica=False):
+        response = self._titles([id]).get(id)
+        if response is None:
+            self.logger.info("Title with id {0} not found!".format(id))
+            return None
+        if pica:
+            return response._parser_data
+        return response
+
+    def titles(self, ids, pica=False):
+        ids = list(dict.fromkeys(ids))
+        found = self._titles(ids)
+        result = {}
+        for id in ids:
+            title = found.get(id)
+            if title is not None and pica:
+                title = title._parser_data
+            result[id] = title
+        return result
+
+    def _lookup(self, kinds, value):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT identifier FROM keys WHERE kind IN ({0}) AND value = ?".format(
+                    ",".join("?" * len(kinds))), list(kinds) + [value]).fetchall()
+        identifiers = [row[0] for row in rows]
+        found = self._titles(identifiers)
+        return [found[identifier] for identifier in identifiers if identifier in found]
+
+    def lookup(self, kind, value):
+        """
+        Return titles whose secondary key of the given kind (idn, issn,
+        issn_l, oclc or parallel_id) matches value
+        """
+        if kind not in STORE_KEYS:
+            raise ValueError("Unknown key {0}!".format(kind))
+        if kind in ("issn", "issn_l"):
+            value = normalize_issn(value)
+        return self._lookup([kind], value)
+
+    def lookup_issn(self, issn):
+        issn = normalize_issn(issn)
+        if issn is None:
+            return []
+        return self._lookup(["issn", "issn_l"], issn)
+
+    def lookup_idn(self, idn):
+        return self._lookup(["idn"], idn)
+
+    def stream(self, batch_size=1000):
+        rowid = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, data FROM titles WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for rowid, data in rows:
+                yield docs.TitleResponseParser(utils.json_loads(data))
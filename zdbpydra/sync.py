@@ -0,0 +1,170 @@
+"""
+Incremental synchronisation of a local NDJSON mirror with the German Union Catalogue of Serials (ZDB)
+
+For every query a high-water mark is stored, i.e. the latest change
+timestamp (001B) seen so far. Subsequent runs only apply records changed
+since that mark, either by restricting the CQL query to a date index (if
+given) or by filtering the result set on the client side. Without a
+date index, the whole result set is read on every run, unless results
+are ordered by latest change, which allows to stop at the first title
+older than the mark. Titles missing from a complete (unrestricted)
+result set are deleted from the mirror.
+"""
+
+import os
+import datetime
+
+from . import utils
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def changed_at(title):
+    """
+    Return the latest change (001B) of title as datetime object (if any)
+    """
+    pica = title.pica
+    if pica is None:
+        return None
+    try:
+        return pica.latest_change_datetime
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return None
+
+
+class SyncState:
+
+    def __init__(self, path):
+        self.path = path
+        self.marks = {}
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as state_file:
+                self.marks = utils.json_loads(state_file.read())
+
+    def get(self, query):
+        mark = self.marks.get(query)
+        if mark is not None:
+            return datetime.datetime.fromisoformat(mark)
+
+    def set(self, query, mark):
+        self.marks[query] = mark.isoformat()
+
+    def save(self):
+        temp_path = "{0}.tmp".format(self.path)
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            state_file.write(utils.json_str_pretty(self.marks))
+        os.replace(temp_path, self.path)
+
+
+class Sync:
+
+    def __init__(self, hydra, state_path, date_index=None, date_format=DATE_FORMAT,
+                 ordered=False):
+        """
+        If results are known to be ordered by latest change (descending),
+        set ordered to stop reading the result set at the first title
+        older than the high-water mark. The order is verified up to the
+        end of the page holding that title and the whole result set is
+        read if it is violated.
+        """
+        self.hydra = hydra
+        self.state = SyncState(state_path)
+        self.date_index = date_index
+        self.date_format = date_format
+        self.ordered = ordered
+        self.logger = hydra.logger
+
+    def _query(self, query, mark):
+        if mark is not None and self.date_index is not None:
+            return "({0}) and {1}>={2}".format(query, self.date_index,
+                                               mark.strftime(self.date_format))
+        return query
+
+    def changes(self, query, mark=None, size=100):
+        """
+        Collect titles changed since mark and, if the full result set
+        was read, the identifiers of all titles currently matching query
+        """
+        restricted = self._query(query, mark)
+        total = self.hydra.total(restricted)
+        upserts = {}
+        seen = set()
+        latest = mark
+        complete = True
+        stopped = False
+        ordered = self.ordered
+        previous = None
+        stop_at = None
+        count = 0
+        for title in self.hydra.stream(restricted, size=size):
+            count += 1
+            identifier = title.identifier
+            seen.add(identifier)
+            changed = changed_at(title)
+            if changed is not None and (latest is None or changed > latest):
+                latest = changed
+            if ordered and changed is not None:
+                if previous is not None and changed > previous:
+                    self.logger.warning(
+                        "Results of {0} are not ordered by latest change, reading all titles.".format(
+                            query))
+                    ordered = False
+                previous = changed
+            if mark is None or changed is None or changed > mark:
+                upserts[identifier] = title.raw
+            elif ordered and stop_at is None:
+                stop_at = -(-count // size) * size
+            if ordered and stop_at is not None and count >= stop_at:
+                stopped = True
+                break
+        if count < total and not stopped:
+            self.logger.error("Sync of {0} read {1} of {2} titles!".format(
+                query, count, total))
+            complete = False
+        if restricted != query or stopped or not complete:
+            seen = None
+        return upserts, seen, latest, complete
+
+    def apply(self, path, upserts, seen=None):
+        """
+        Rewrite the mirror at path with upserted titles, dropping titles
+        not in seen (if given), and return the number of deleted titles
+        """
+        upserts = dict(upserts)
+        deleted = 0
+        temp_path = "{0}.tmp".format(path)
+        with open(temp_path, "w", encoding="utf-8") as mirror_out:
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as mirror_in:
+                    for line in mirror_in:
+                        if not line.strip():
+                            continue
+                        identifier = utils.json_loads(line).get("identifier")
+                        if identifier in upserts:
+                            line = utils.json_str(upserts.pop(identifier)) + "\n"
+                        elif seen is not None and identifier not in seen:
+                            deleted += 1
+                            continue
+                        mirror_out.write(line)
+            for identifier in upserts:
+                mirror_out.write(utils.json_str(upserts[identifier]))
+                mirror_out.write("\n")
+        os.replace(temp_path, path)
+        return deleted
+
+    def run(self, query, path, size=100):
+        mark = self.state.get(query)
+        if not os.path.isfile(path):
+            mark = None
+        upserts, seen, latest, complete = self.changes(query, mark=mark, size=size)
+        if not complete and mark is None:
+            self.logger.error("Initial sync of {0} incomplete, mirror unchanged!".format(query))
+            return {"query": query, "upserted": 0, "deleted": 0,
+                    "mark": None, "complete": False}
+        deleted = self.apply(path, upserts, seen=seen)
+        if complete and latest is not None:
+            self.state.set(query, latest)
+            self.state.save()
+        return {"query": query, "upserted": len(upserts), "deleted": deleted,
+                "mark": latest.isoformat() if latest is not None else None,
+                "complete": complete}
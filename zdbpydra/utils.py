@@ -1,8 +1,29 @@
+import os
 import re
 import csv
 import json
+import time
 import logging
 import requests
+import requests.adapters
+import threading
+import urllib3.connection
+import urllib3.connectionpool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 from . import __version__
 
@@ -24,17 +45,150 @@ def get_logger(name="zdbpydra", loglevel=None):
     return logger
 
 
-def get_request(url, headers={}):
+_timing = threading.local()
+
+
+def reset_connect_time():
+    _timing.connect = 0.0
+
+
+def connect_time():
+    """
+    Seconds spent establishing connections by the current thread
+    since the last call of reset_connect_time
+    """
+    return getattr(_timing, "connect", 0.0)
+
+
+class TimedHTTPConnection(urllib3.connection.HTTPConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timing.connect = connect_time() + time.perf_counter() - start
+
+
+class TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _timing.connect = connect_time() + time.perf_counter() - start
+
+
+class TimedHTTPConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(urllib3.connectionpool.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool
+        }
+
+
+def get_session(pool_size=10, pool_block=False):
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=pool_size,
+                               pool_maxsize=pool_size,
+                               pool_block=pool_block)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def default_session():
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = get_session()
+        return _default_session
+
+
+def get_request(url, headers={}, session=None, policy=None, stream=False, read=False):
     if "User-Agent" not in headers:
         headers["User-Agent"] = "zdbpydra {0}".format(__version__)
+    if session is None:
+        session = default_session()
+    if policy is not None:
+        return policy.request(session, url, headers=headers, stream=stream, read=read)
     try:
-        return requests.get(url, headers=headers)
+        response = session.get(url, headers=headers, stream=stream)
+        if read:
+            response.content
+        return response
     except requests.exceptions.RequestException as err:
         logger = get_logger()
         logger.error(err.__class__.__name__)
         return None
 
 
+class _Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs
+    the function, callers arriving while it runs wait for its result
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Return the result of the call and whether it was shared with
+        (i.e. produced by) another caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
 def response_ok(response, loglevel=None):
     if response is None:
         return False
@@ -50,8 +204,8 @@ def response_ok(response, loglevel=None):
 def response_json(response):
     if response_ok(response):
         try:
-            return response.json()
-        except requests.exceptions.JSONDecodeError:
+            return json_loads(response.content)
+        except json_errors():
             logger = get_logger()
             logger.error(
                 "Failed to parse JSON data retrieved from URL {0}".format(response.url))
@@ -59,17 +213,93 @@ def response_json(response):
                 logger.error("Found payload: {0}".format(response.text))
 
 
-def json_request(url, headers={}):
-    response = get_request(url, headers=headers)
+def json_request(url, headers={}, session=None, policy=None):
+    response = get_request(url, headers=headers, session=session, policy=policy)
     return response_json(response)
 
 
+class JsonBackend:
+
+    def __init__(self, name, loads, dumps, dumps_pretty, errors=(ValueError,)):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.dumps_pretty = dumps_pretty
+        self.errors = errors
+
+
+def _json_backends():
+    backends = {}
+    if orjson is not None:
+        backends["orjson"] = JsonBackend(
+            "orjson", orjson.loads,
+            lambda data: orjson.dumps(data).decode("utf-8"),
+            lambda data: orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8"),
+            (orjson.JSONDecodeError,))
+    if msgspec is not None:
+        backends["msgspec"] = JsonBackend(
+            "msgspec", msgspec.json.decode,
+            lambda data: msgspec.json.encode(data).decode("utf-8"),
+            lambda data: msgspec.json.format(msgspec.json.encode(data),
+                                             indent=2).decode("utf-8"),
+            (msgspec.DecodeError, ValueError))
+    if ujson is not None:
+        backends["ujson"] = JsonBackend(
+            "ujson", ujson.loads,
+            lambda data: ujson.dumps(data, ensure_ascii=False,
+                                     escape_forward_slashes=False),
+            lambda data: ujson.dumps(data, ensure_ascii=False,
+                                     escape_forward_slashes=False, indent=2))
+    backends["json"] = JsonBackend(
+        "json", json.loads,
+        lambda data: json.dumps(data, ensure_ascii=False),
+        lambda data: json.dumps(data, ensure_ascii=False, indent=2))
+    return backends
+
+
+JSON_BACKENDS = _json_backends()
+
+_json = None
+
+
+def set_json_backend(name=None):
+    """
+    Select the JSON backend by name (orjson, msgspec, ujson or json). If
+    no name is given, the environment variable ZDBPYDRA_JSON or else the
+    fastest installed backend is used.
+    """
+    global _json
+    if name is None:
+        name = os.environ.get("ZDBPYDRA_JSON")
+    if name is None:
+        name = next(iter(JSON_BACKENDS))
+    if name not in JSON_BACKENDS:
+        raise ValueError("JSON backend {0} is not available!".format(name))
+    _json = JSON_BACKENDS[name]
+    return _json.name
+
+
+def json_backend():
+    return _json.name
+
+
+def json_errors():
+    return _json.errors
+
+
+def json_loads(data):
+    return _json.loads(data)
+
+
 def json_str(data):
-    return json.dumps(data, ensure_ascii=False)
+    return _json.dumps(data)
 
 
 def json_str_pretty(data):
-    return json.dumps(data, ensure_ascii=False, indent=2)
+    return _json.dumps_pretty(data)
+
+
+set_json_backend()
 
 
 def clean_blanks(value):
@@ -79,7 +309,12 @@ def clean_blanks(value):
         return value
 
 
+def write_csv_file(csv_output, csv_file):
+    writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_NONNUMERIC)
+    for row in csv_output:
+        writer.writerow(row)
+
+
 def write_csv(csv_output, csv_path):
     with open(csv_path, "w", newline="") as csv_file:
-        writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_NONNUMERIC)
-        writer.writerows(csv_output)
+        write_csv_file(csv_output, csv_file)